@@ -0,0 +1,132 @@
+"""
+Async counterparts of the `crud` functions used by the API endpoints.
+
+Simple reads are written natively against `AsyncSession`. Write paths that also maintain the
+search index and statistics rollups reuse the sync implementations through
+`AsyncSession.run_sync`, which runs them on the async driver without blocking the event loop.
+Results must be fully loaded before they leave these functions: lazy loads are not possible
+once control is back in the endpoint.
+"""
+from collections import defaultdict
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import bodies
+import crud
+import models
+import schemas
+
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    """Fetch a user by id."""
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    return result.scalars().first()
+
+
+async def get_user_with_conversations(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    """Fetch a user with every conversation, its tags and full texts loaded, for the /users/me payload."""
+    result = await db.execute(
+        select(models.User)
+        .options(selectinload(models.User.conversations).selectinload(models.Conversation.tags))
+        .where(models.User.id == user_id)
+    )
+    user = result.scalars().first()
+    if user is not None:
+        compressed = [c.id for c in user.conversations if bodies.maybe_compressed(c.prompt, c.response)]
+        if compressed:
+            bodies.apply(user.conversations, bodies.unpack(await db.execute(bodies.load_statement(compressed))))
+    return user
+
+
+async def get_conversation(db: AsyncSession, user_id: int, conversation_id: int) -> Optional[models.Conversation]:
+    """Fetch one of the user's conversations with its tags and full texts."""
+    result = await db.execute(
+        select(models.Conversation)
+        .options(selectinload(models.Conversation.tags))
+        .where(models.Conversation.id == conversation_id, models.Conversation.owner_id == user_id)
+    )
+    conversation = result.scalars().first()
+    if conversation is not None and bodies.maybe_compressed(conversation.prompt, conversation.response):
+        bodies.apply([conversation], bodies.unpack(await db.execute(bodies.load_statement([conversation.id]))))
+    return conversation
+
+
+async def export_conversations(db: AsyncSession, user_id: int, chunk_size: int = 500) -> AsyncIterator[List[dict]]:
+    """
+    Stream all of the user's conversations in id order, `chunk_size` rows at a time, as plain dicts
+    with their tag names. Rows come from a server-side cursor and tags and compressed bodies are
+    loaded per chunk, so memory use doesn't grow with the size of the archive.
+    """
+    conversation = models.Conversation
+    assoc = models.conversation_tag_association
+    result = await db.stream(
+        select(conversation.id, conversation.source, conversation.prompt, conversation.response,
+               conversation.conversation_timestamp, conversation.created_at, conversation.tagging_status)
+        .where(conversation.owner_id == user_id)
+        .order_by(conversation.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for rows in result.mappings().partitions():
+        tag_names = defaultdict(list)
+        tag_rows = await db.execute(
+            select(assoc.c.conversation_id, models.Tag.name)
+            .join(models.Tag, models.Tag.id == assoc.c.tag_id)
+            .where(assoc.c.conversation_id.in_([row["id"] for row in rows]))
+            .order_by(assoc.c.conversation_id, models.Tag.name)
+        )
+        for conversation_id, name in tag_rows:
+            tag_names[conversation_id].append(name)
+        compressed = [row["id"] for row in rows if bodies.maybe_compressed(row["prompt"], row["response"])]
+        texts = bodies.unpack(await db.execute(bodies.load_statement(compressed))) if compressed else {}
+        chunk = []
+        for row in rows:
+            item = {**row, "tags": tag_names[row["id"]]}
+            if row["id"] in texts:
+                item["prompt"], item["response"] = texts[row["id"]]
+            chunk.append(item)
+        yield chunk
+
+
+async def get_conversations(db: AsyncSession, user_id: int, **filters):
+    """See crud.get_conversations."""
+    return await db.run_sync(crud.get_conversations, user_id, **filters)
+
+
+async def create_conversation(db: AsyncSession, user_id: int,
+                              conversation: schemas.ConversationCreate) -> Tuple[models.Conversation, bool]:
+    """See crud.create_conversation."""
+    return await db.run_sync(crud.create_conversation, user_id, conversation)
+
+
+async def create_conversations(db: AsyncSession, user_id: int,
+                               conversations: List[schemas.ConversationCreate]) -> List[Tuple[int, bool]]:
+    """See crud.create_conversations."""
+    return await db.run_sync(crud.create_conversations, user_id, conversations)
+
+
+async def delete_conversation(db: AsyncSession, conversation: models.Conversation):
+    """See crud.delete_conversation. The conversation must have been loaded with its tags."""
+    await db.run_sync(crud.delete_conversation, conversation)
+
+
+async def get_related_conversations(db: AsyncSession, user_id: int, conversation_id: int, k: int):
+    """See crud.get_related_conversations."""
+    return await db.run_sync(crud.get_related_conversations, user_id, conversation_id, k)
+
+
+async def get_statistics_summary(db: AsyncSession, user_id: int):
+    """See crud.get_statistics_summary."""
+    return await db.run_sync(crud.get_statistics_summary, user_id)
+
+
+async def get_calendar(db: AsyncSession, user_id: int, month: str):
+    """See crud.get_calendar."""
+    return await db.run_sync(crud.get_calendar, user_id, month)
+
+
+async def get_tag_frequency(db: AsyncSession, user_id: int):
+    """See crud.get_tag_frequency."""
+    return await db.run_sync(crud.get_tag_frequency, user_id)
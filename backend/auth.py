@@ -1,12 +1,9 @@
 # auth.py (상단)
 import os
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-import requests
 
 # --- Environment Variables ---
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
@@ -57,8 +54,12 @@ client_config = {
     }
 }
 
-flow = Flow.from_client_config(
-    client_config=client_config,
-    scopes=SCOPES,
-    redirect_uri=REDIRECT_URI,
-)
+@lru_cache(maxsize=None)
+def get_flow():
+    """OAuth flow, built on first use so google-auth-oauthlib isn't imported at startup."""
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_config(
+        client_config=client_config,
+        scopes=SCOPES,
+        redirect_uri=REDIRECT_URI,
+    )
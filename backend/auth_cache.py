@@ -0,0 +1,108 @@
+"""
+In-process cache for authenticated users.
+
+`get_current_user` runs on every protected request. Two bounded TTL/LRU caches let it skip
+work for recently seen callers:
+- `tokens`: JWT string -> user id (skips signature verification; never outlives the token's exp)
+- `users`:  user id -> CachedUser (skips the users table lookup)
+
+Each uvicorn worker has its own cache, so a deleted user can stay valid in other workers for
+at most AUTH_CACHE_TTL seconds. Call `invalidate_user` after changing or deleting a user;
+ORM deletes of `models.User` do it automatically.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import event
+
+import models
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))  # seconds; 0 disables caching
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The fields endpoints need from the authenticated user, safe to share across sessions."""
+    id: int
+    email: str
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+tokens = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+users = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id: int):
+    """Forget a user so the next request re-reads it from the database."""
+    users.invalidate(user_id)
+
+
+def stats() -> dict:
+    return {"tokens": tokens.stats(), "users": users.stats(), "ttl_seconds": AUTH_CACHE_TTL}
+
+
+@event.listens_for(models.User, "after_delete")
+@event.listens_for(models.User, "after_update")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.id)
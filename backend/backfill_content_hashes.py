@@ -0,0 +1,79 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models
+import bodies
+import crud
+import migrate
+
+
+def backfill_content_hashes(chunk_size: int = 1000):
+    """
+    Fingerprint conversations saved before deduplication existed.
+    The oldest copy of each duplicate keeps the hash; later copies are left without one and reported.
+    """
+    migrate.run_migrations(engine)
+    db: Session = SessionLocal()
+    try:
+        total = db.query(models.Conversation).filter(models.Conversation.content_hash.is_(None)).count()
+        print(f"Hashing {total} conversations...")
+
+        after_id, done, duplicates = 0, 0, []
+        while True:
+            rows = db.execute(
+                select(models.Conversation.id, models.Conversation.owner_id, models.Conversation.source,
+                       models.Conversation.prompt, models.Conversation.response)
+                .where(models.Conversation.id > after_id, models.Conversation.content_hash.is_(None))
+                .order_by(models.Conversation.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            hashes = {
+                conversation_id: crud.content_hash(owner_id, source, prompt, response)
+                for conversation_id, owner_id, source, prompt, response in bodies.resolve(db, rows)
+            }
+            taken = set(db.execute(
+                select(models.Conversation.content_hash)
+                .where(models.Conversation.content_hash.in_(set(hashes.values())))
+            ).scalars())
+            updates = []
+            for conversation_id, digest in hashes.items():
+                if digest in taken:
+                    duplicates.append(conversation_id)
+                else:
+                    taken.add(digest)
+                    updates.append({"id": conversation_id, "content_hash": digest})
+            if updates:
+                db.execute(
+                    text("UPDATE conversations SET content_hash = :content_hash WHERE id = :id"), updates
+                )
+            db.commit()
+
+            after_id = rows[-1].id
+            done += len(rows)
+            print(f"Hashed {done}/{total}")
+
+        if duplicates:
+            print(f"\n{len(duplicates)} duplicate conversations were left unhashed: {duplicates}")
+        print("\nContent hashes backfilled successfully!")
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add content hashes to conversations saved before deduplication.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="conversations per transaction")
+    args = parser.parse_args()
+
+    backfill_content_hashes(chunk_size=args.chunk_size)
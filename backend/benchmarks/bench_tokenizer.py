@@ -0,0 +1,56 @@
+"""
+Micro-benchmark: constructing Okt per call vs. the shared tokenizer instance.
+
+Usage:
+    python benchmarks/bench_tokenizer.py --texts 200
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tokenizer
+from benchmarks import corpus
+
+
+def per_call(texts):
+    from konlpy.tag import Okt
+    for text in texts:
+        Okt().pos(text, norm=True, stem=True)
+
+
+def shared(texts):
+    for text in texts:
+        tokenizer.pos(text)
+
+
+def run(label, fn, texts):
+    start = time.perf_counter()
+    fn(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {len(texts) / elapsed:10.1f} texts/sec  ({elapsed * 1000 / len(texts):.2f} ms/text)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=200, help="number of prompts and responses to tag")
+    args = parser.parse_args()
+
+    texts = [t for pair in corpus.generate(args.texts // 2) for t in pair]
+
+    # Start the JVM once up front so neither variant is charged for it.
+    cold_start = time.perf_counter()
+    tokenizer.init(prewarm=True)
+    print(f"JVM start + warm-up: {(time.perf_counter() - cold_start) * 1000:.0f} ms")
+
+    per_call_time = run("per-call", per_call, texts)
+    shared_time = run("shared", shared, texts)
+    print(f"speed-up: {per_call_time / shared_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Check that importing the API stays fast and free of heavy modules.
+
+Imports `main` in a fresh interpreter with `-X importtime` and fails if the cumulative
+import time exceeds the budget, or if a module that should only load on demand
+(the tokenizer's JVM bridge, the Google OAuth client, ...) was imported.
+
+Usage:
+    python benchmarks/check_import_time.py --budget-ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use (OAuth login, first tagging job), never while importing the app.
+LAZY_MODULES = ["konlpy", "jpype", "kiwipiepy", "google_auth_oauthlib", "googleapiclient", "requests", "passlib"]
+
+
+def profile_import(module: str):
+    """Return {top-level module: cumulative microseconds} for `import module`."""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "import_time.db"))
+    env.setdefault("GOOGLE_CLIENT_ID", "import-time-check")
+    env.setdefault("GOOGLE_CLIENT_SECRET", "import-time-check")
+    env.setdefault("JWT_SECRET_KEY", "import-time-check")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        # "import time:      self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.rstrip()[1:]] = int(cumulative)  # drop the separator space, keep the nesting
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="maximum cumulative import time")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    args = parser.parse_args()
+
+    modules = profile_import(args.module)
+    total_ms = modules[args.module] / 1000
+    # Nesting is shown by indentation; the module's own imports are indented by two spaces.
+    direct = {name.strip(): us for name, us in modules.items() if name.startswith("  ") and not name.startswith("   ")}
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, us in sorted(direct.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    loaded = {name.strip().split(".")[0] for name in modules}
+    eager = [name for name in LAZY_MODULES if name in loaded]
+    failures = []
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"{total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
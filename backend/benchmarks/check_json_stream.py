@@ -0,0 +1,62 @@
+"""
+Check that the importer's streaming JSON reader handles values split across reads.
+
+Parses a set of JSON arrays with `importer.iter_json_array` at every read size from 1 byte
+up to the whole document and fails if any result differs from `json.loads`.
+
+Usage:
+    python benchmarks/check_json_stream.py
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "json_stream.db"))
+
+import importer
+
+DOCUMENTS = [
+    "[]",
+    " \ufeff[ ]",
+    "[1,22,333]",
+    "[ -4.5e10 , 0.25,-0, 1E+3 ]",
+    '[true,false,null,"",7]',
+    '["a,b]", "\\"quoted\\" \\u00e9", "파이썬 리스트"]',
+    '[{"prompt": "1,2", "n": 12345}, [1, [22, [333]]], {}]',
+    json.dumps([{"title": "t", "mapping": {"a": {"message": {"content": {"parts": ["x" * 50, 123]}}}}}] * 3),
+]
+
+
+def main():
+    failures = []
+    for document in DOCUMENTS:
+        expected = json.loads(document.lstrip("\ufeff "))
+        for read_size in range(1, len(document) + 2):
+            try:
+                actual = list(importer.iter_json_array(io.StringIO(document), read_size=read_size))
+            except ValueError as e:
+                actual = e
+            if actual != expected:
+                failures.append(f"read_size={read_size} {document[:40]!r}: {actual!r}")
+                break
+
+    for document in ("{}", "[1, 2"):
+        try:
+            list(importer.iter_json_array(io.StringIO(document), read_size=1))
+            failures.append(f"{document!r} was accepted")
+        except ValueError:
+            pass
+
+    print(f"{len(DOCUMENTS)} documents at every read size")
+    if failures:
+        sys.exit("FAIL:\n  " + "\n  ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Check that listing conversations runs a constant number of SQL statements.
+
+Builds two users with small and large archives in a throwaway SQLite database,
+lists and serializes one page for each, and fails if the statement counts differ.
+The page is listed through both the sync session and the endpoints' `AsyncSession`
+(`async_crud`, which runs the sync code through `run_sync`); the two counts must agree,
+so statements on the async path are counted too.
+
+Usage:
+    python benchmarks/check_query_count.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "query_count.db")
+
+import async_crud
+import crud
+import database
+import instrumentation
+import migrate
+import models
+import schemas
+
+
+def make_user(db, email: str, conversations: int) -> int:
+    user = models.User(email=email)
+    db.add(user)
+    db.flush()
+    for i in range(conversations):
+        conversation = models.Conversation(
+            source="CHAT_GPT", prompt=f"prompt {i}", response=f"response {i}",
+            owner_id=user.id, tagging_status=models.TAGGING_DONE,
+        )
+        conversation.tags = [models.Tag(name=f"{email}-tag-{i}-{j}") for j in range(3)]
+        db.add(conversation)
+    db.commit()
+    return user.id
+
+
+def list_page(user_id: int, limit: int) -> int:
+    """Statements needed to fetch and serialize one page."""
+    db = database.SessionLocal()
+    try:
+        with instrumentation.count_queries() as counter:
+            items, next_cursor = crud.get_conversations(db, user_id=user_id, limit=limit)
+            schemas.ConversationPage.model_validate({"items": items, "next_cursor": next_cursor})
+        return counter.count
+    finally:
+        db.close()
+
+
+async def list_page_async(user_id: int, limit: int) -> int:
+    """Statements needed to fetch and serialize one page through the endpoints' async session."""
+    async with database.AsyncSessionLocal() as db:
+        with instrumentation.count_queries() as counter:
+            items, next_cursor = await async_crud.get_conversations(db, user_id=user_id, limit=limit)
+            schemas.ConversationPage.model_validate({"items": items, "next_cursor": next_cursor})
+        return counter.count
+
+
+def main():
+    migrate.run_migrations(database.engine)
+    instrumentation.install(database.engine)
+    instrumentation.install(database.async_engine.sync_engine)
+
+    db = database.SessionLocal()
+    small = make_user(db, "small@example.com", 2)
+    large = make_user(db, "large@example.com", 100)
+    db.close()
+
+    small_count = list_page(small, limit=crud.MAX_PAGE_SIZE)
+    large_count = list_page(large, limit=crud.MAX_PAGE_SIZE)
+    print(f"2 conversations: {small_count} queries, 100 conversations: {large_count} queries")
+    if small_count != large_count:
+        sys.exit("Query count grows with the number of conversations (N+1 loading?)")
+
+    async_count = asyncio.run(list_page_async(large, limit=crud.MAX_PAGE_SIZE))
+    print(f"100 conversations through the async session: {async_count} queries")
+    if async_count != large_count:
+        sys.exit("Statements on the async session path are not all counted")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare tokenizer engines on the same corpus: throughput, and how closely each one's nouns and
+tags agree with a reference engine (Okt by default).
+
+Usage:
+    python benchmarks/compare_tokenizers.py --engines okt regex kiwi --texts 400
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crud
+import tag_scoring
+import tokenizer
+from benchmarks import corpus
+
+
+def f1(predicted, expected) -> float:
+    predicted, expected = set(predicted), set(expected)
+    if not predicted and not expected:
+        return 1.0
+    overlap = len(predicted & expected)
+    if not overlap:
+        return 0.0
+    precision, recall = overlap / len(predicted), overlap / len(expected)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_engine(engine, pairs):
+    """Tokenize every pair with one engine. Returns (start-up seconds, tagging seconds, nouns, tags)."""
+    started = time.perf_counter()
+    tokenizer.get_engine(engine).pos(tokenizer.WARM_UP_TEXT)
+    startup = time.perf_counter() - started
+
+    started = time.perf_counter()
+    nouns = [(crud.tokenize_nouns(prompt, engine), crud.tokenize_nouns(response, engine)) for prompt, response in pairs]
+    elapsed = time.perf_counter() - started
+    # No archive statistics: every engine's tags are ranked the same way, by weighted term frequency.
+    tags = tag_scoring.rank([(None, prompt_nouns, response_nouns) for prompt_nouns, response_nouns in nouns])
+    return startup, elapsed, nouns, tags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--engines", nargs="+", default=list(tokenizer.ENGINES), choices=list(tokenizer.ENGINES))
+    parser.add_argument("--reference", default="okt", choices=list(tokenizer.ENGINES),
+                        help="engine whose output counts as correct")
+    parser.add_argument("--texts", type=int, default=400, help="number of prompts and responses to tag")
+    args = parser.parse_args()
+
+    pairs = list(corpus.generate(args.texts // 2))
+    texts = 2 * len(pairs)
+    engines = [args.reference] + [engine for engine in args.engines if engine != args.reference]
+
+    results = {}
+    for engine in engines:
+        try:
+            results[engine] = run_engine(engine, pairs)
+        except Exception as exc:  # e.g. no JVM for Okt, kiwipiepy not installed
+            print(f"{engine:<6} unavailable: {exc!r}")
+
+    reference = results.get(args.reference)
+    print(f"\n{'engine':<6} {'start-up':>10} {'texts/sec':>10} {'ms/text':>8}  "
+          f"{'noun F1':>8} {'tag F1':>7} {'top tag':>8}   (vs {args.reference})")
+    for engine, (startup, elapsed, nouns, tags) in results.items():
+        line = f"{engine:<6} {startup * 1000:8.0f}ms {texts / elapsed:10.1f} {elapsed * 1000 / texts:8.3f}"
+        if reference is not None:
+            _, _, reference_nouns, reference_tags = reference
+            noun_f1 = sum(
+                f1(prompt + response, reference_prompt + reference_response)
+                for (prompt, response), (reference_prompt, reference_response) in zip(nouns, reference_nouns)
+            ) / len(pairs)
+            tag_f1 = sum(f1(t, r) for t, r in zip(tags, reference_tags)) / len(pairs)
+            top_tag = sum(bool(t and r and t[0] == r[0]) for t, r in zip(tags, reference_tags)) / len(pairs)
+            line += f"  {noun_f1:8.3f} {tag_f1:7.3f} {top_tag:8.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Synthetic mixed Korean/English prompts shared by the benchmark scripts.
+"""
+import datetime
+import random
+
+PROMPTS = [
+    "파이썬에서 리스트를 정렬하는 가장 빠른 방법은?",
+    "How do I paginate a SQLAlchemy query with a cursor?",
+    "FastAPI에서 JWT 인증 미들웨어를 어떻게 구현하나요?",
+    "React useEffect 의존성 배열 경고를 해결하는 방법 알려줘",
+    "PostgreSQL 인덱스가 사용되지 않는 이유를 설명해줘",
+    "Write a regex that matches Korean Hangul syllables only.",
+    "도커 컨테이너 메모리 제한 설정 예시를 보여줘",
+    "Next.js 라우팅에서 동적 세그먼트와 searchParams 차이",
+    "크롬 확장 프로그램 manifest v3 service worker 수명 주기",
+    "Explain the difference between TF-IDF and BM25 ranking.",
+    "자바 가상 머신 메모리 구조와 가비지 컬렉션 동작 원리",
+    "Tailwind CSS로 반응형 사이드바 레이아웃 만들기",
+]
+
+RESPONSES = [
+    "`sorted()` 함수는 새 리스트를 반환하고, `list.sort()`는 제자리에서 정렬합니다. 두 방법 모두 Timsort 알고리즘을 사용합니다.",
+    "Use keyset pagination: order by (timestamp, id) and filter rows strictly after the last cursor value instead of OFFSET.",
+    "의존성 주입(Depends)으로 토큰을 검증하고, 실패하면 HTTPException 401을 발생시키면 됩니다. jose 라이브러리로 디코딩합니다.",
+    "의존성 배열에 사용하는 모든 값을 포함하거나 useCallback으로 함수 참조를 고정하세요.",
+    "함수로 컬럼을 감싸면 인덱스를 사용할 수 없습니다. 범위 조건으로 바꾸고 EXPLAIN ANALYZE로 실행 계획을 확인하세요.",
+    "The pattern [가-힣]+ matches complete Hangul syllables; add \\u3131-\\u318E for compatibility jamo.",
+    "docker run --memory=512m 옵션 또는 compose 파일의 deploy.resources.limits 항목을 사용합니다.",
+    "동적 세그먼트는 경로의 일부이고 searchParams는 쿼리 문자열입니다. 서버 컴포넌트에서는 props로 전달됩니다.",
+    "Service worker는 이벤트가 없으면 약 30초 후 종료되므로 상태는 chrome.storage에 저장해야 합니다.",
+    "BM25 saturates term frequency and normalises by document length, while plain TF-IDF grows linearly with frequency.",
+    "힙 영역은 Young/Old 세대로 나뉘며, Minor GC와 Major GC가 각 세대를 정리합니다.",
+    "flex와 md:w-64 같은 브레이크포인트 유틸리티를 조합하면 모바일에서는 숨기고 데스크톱에서는 고정할 수 있습니다.",
+]
+
+
+def generate(n: int, seed: int = 42):
+    """Yield `n` (prompt, response) pairs mixed from the sample corpus."""
+    rng = random.Random(seed)
+    for i in range(n):
+        prompt = rng.choice(PROMPTS)
+        response = " ".join(rng.sample(RESPONSES, k=rng.randint(1, 4)))
+        # Vary the text a little so every pair is unique.
+        yield f"{prompt} (#{i})", response
+
+
+# Words that occur in the corpus, used as search queries.
+SEARCH_TERMS = ["파이썬", "리스트", "인덱스", "도커", "메모리", "docker", "React", "pagination", "BM25", "가비지 컬렉션"]
+
+SOURCES = ["CHAT_GPT", "GEMINI"]
+
+
+def conversations(n: int, seed: int = 42, start: datetime.datetime = datetime.datetime(2025, 1, 1), days: int = 365):
+    """Yield `n` ConversationCreate-shaped dicts spread over `days` days from `start`."""
+    rng = random.Random(seed)
+    for prompt, response in generate(n, seed):
+        yield {
+            "source": rng.choice(SOURCES),
+            "prompt": prompt,
+            "response": response,
+            "conversation_timestamp": (start + datetime.timedelta(seconds=rng.randrange(days * 86400))).isoformat(),
+        }
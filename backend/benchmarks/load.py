@@ -0,0 +1,328 @@
+"""
+Load benchmark for the ingestion, listing, search, related-conversation and statistics endpoints.
+
+Seeds synthetic Korean/English archives, mints JWTs with `auth.create_access_token`, then fires
+requests at the app in-process (httpx ASGI transport) or at a running server (--url), and
+reports throughput and p50/p95/p99 latency per endpoint, plus the cost of tagging.
+Results are written as JSON so two commits can be compared with --compare.
+
+Requires httpx, which the API itself doesn't need: `pip install -r requirements-dev.txt`.
+
+Usage:
+    python benchmarks/load.py --rows 10000 --output before.json
+    python benchmarks/load.py --rows 10000 --output after.json --compare before.json
+    # Against PostgreSQL and a local uvicorn started with the same DATABASE_URL and JWT_SECRET_KEY:
+    python benchmarks/load.py --database-url postgresql://localhost/promptory_bench --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Add the backend directory to the Python path
+sys.path.append(BACKEND_DIR)
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors: int, wall: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "throughput_per_sec": round(len(values) / wall, 1) if wall else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+# --- Seeding ---
+def seed(users: int, rows: int, seed_value: int, tag: bool, workers: int) -> dict:
+    """Create `users` users sharing `rows` conversations; reuses an already seeded database."""
+    import crud
+    import database
+    import models
+    import retag_conversations
+    import schemas
+    from benchmarks import corpus
+
+    db = database.SessionLocal()
+    try:
+        per_user = rows // users
+        user_ids, inserted = [], 0
+        started = time.perf_counter()
+        for i in range(users):
+            user = crud.get_or_create_user(db, {"email": f"bench-{i}@example.com"})
+            user_ids.append(user.id)
+            existing = db.query(models.Conversation).filter(models.Conversation.owner_id == user.id).count()
+            if existing >= per_user:
+                continue  # Seeded by an earlier run.
+            items = corpus.conversations(per_user, seed=seed_value + i)
+            for chunk in iter(lambda: list(itertools.islice(items, 1000)), []):
+                saved = crud.create_conversations(db, user.id, [schemas.ConversationCreate(**item) for item in chunk])
+                inserted += sum(1 for _, created in saved if created)
+        seed_seconds = time.perf_counter() - started
+
+        tag_seconds = 0.0
+        if tag and inserted:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                retag_conversations.retag_all_conversations(
+                    workers=workers, checkpoint=os.path.join(tempfile.mkdtemp(), "checkpoint.json"),
+                    restart=True, pending_only=True,
+                )
+            tag_seconds = time.perf_counter() - started
+
+        # Conversations whose related list the "related" scenario asks for.
+        sample_ids = [
+            [conversation_id for (conversation_id,) in db.query(models.Conversation.id)
+             .filter(models.Conversation.owner_id == user_id).order_by(models.Conversation.id).limit(100)]
+            for user_id in user_ids
+        ]
+    finally:
+        db.close()
+
+    return {
+        "user_ids": user_ids,
+        "sample_ids": sample_ids,
+        "inserted": inserted,
+        "insert_per_sec": round(inserted / seed_seconds, 1) if inserted else None,
+        "tag_per_sec": round(inserted / tag_seconds, 1) if tag_seconds else None,
+    }
+
+
+def bench_tagging(samples: int, seed_value: int, user_id: int) -> dict:
+    """
+    Latency of picking the tags of one conversation with a cold tag cache: tokenizing, then
+    scoring with TAG_SCORING (BM25 by default) against the seeded archive's term frequencies.
+    """
+    import crud
+    import database
+    import tag_cache
+    import tag_scoring
+    import tokenizer
+    from benchmarks import corpus
+
+    tokenizer.init(prewarm=True)
+    tag_cache.cache.clear()
+    pairs = list(corpus.generate(samples, seed=seed_value + 10_000))
+    latencies = []
+    db = database.SessionLocal()
+    try:
+        started = time.perf_counter()
+        for prompt, response in pairs:
+            t0 = time.perf_counter()
+            tag_scoring.rank([(user_id, crud.get_nouns(prompt), crud.get_nouns(response))], db)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    return summarize(latencies, 0, elapsed)
+
+
+# --- Load ---
+async def run_scenario(client, requests, concurrency: int) -> dict:
+    """Send (method, path, kwargs) requests with `concurrency` in flight; returns the summary."""
+    queue = list(requests)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            method, path, kwargs = queue.pop()
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def build_scenarios(tokens, sample_ids, count: int, seed_value: int):
+    """Request lists per endpoint, spread over the seeded users (`sample_ids` lists conversation ids per user)."""
+    from benchmarks import corpus
+
+    rng = random.Random(seed_value)
+    headers = [{"Authorization": f"Bearer {token}"} for token in tokens]
+    fresh = corpus.conversations(count * 21, seed=seed_value + 20_000)
+
+    def new_item():
+        item = next(fresh)
+        item["prompt"] += f" [load {rng.random():.12f}]"  # unique content, so nothing is deduplicated
+        return item
+
+    def month():
+        return f"2025-{rng.randint(1, 12):02d}"
+
+    return {
+        "create": [("POST", "/api/v1/conversations", {"json": new_item(), "headers": rng.choice(headers)})
+                   for _ in range(count)],
+        "create_batch_20": [("POST", "/api/v1/conversations:batch",
+                             {"json": [new_item() for _ in range(20)], "headers": rng.choice(headers)})
+                            for _ in range(max(1, count // 20))],
+        "list": [("GET", "/api/v1/conversations", {"params": {"limit": 20}, "headers": rng.choice(headers)})
+                 for _ in range(count)],
+        "list_month": [("GET", "/api/v1/conversations",
+                        {"params": {"from": f"{m}-01", "to": f"{m}-28", "limit": 20}, "headers": rng.choice(headers)})
+                       for m in (month() for _ in range(count))],
+        "search": [("GET", "/api/v1/conversations", {"params": {"q": rng.choice(corpus.SEARCH_TERMS), "limit": 20},
+                                                     "headers": rng.choice(headers)}) for _ in range(count)],
+        "statistics_summary": [("GET", "/api/v1/statistics/summary", {"headers": rng.choice(headers)})
+                               for _ in range(count)],
+        "statistics_tags": [("GET", "/api/v1/statistics/tags", {"headers": rng.choice(headers)})
+                            for _ in range(count)],
+        "calendar": [("GET", "/api/v1/statistics/calendar", {"params": {"month": month()}, "headers": rng.choice(headers)})
+                     for _ in range(count)],
+        # The first request per user loads that user's similarity index.
+        "related": [("GET", f"/api/v1/conversations/{rng.choice(sample_ids[i])}/related",
+                     {"params": {"k": 10}, "headers": headers[i]})
+                    for i in (rng.randrange(len(headers)) for _ in range(count)) if sample_ids[i]],
+    }
+
+
+async def run_load(args, tokens, sample_ids) -> dict:
+    import httpx
+
+    scenarios = build_scenarios(tokens, sample_ids, args.requests, args.seed)
+    selected = args.scenarios or list(scenarios)
+    results = {}
+
+    async def run_all(client):
+        for name in selected:
+            # A short warm-up so connection setup and first-use imports aren't measured.
+            warm_up = min(args.concurrency, len(scenarios[name]) // 10)
+            await run_scenario(client, scenarios[name][:warm_up], args.concurrency)
+            results[name] = await run_scenario(client, scenarios[name][warm_up:], args.concurrency)
+            print(f"{name:<20} {results[name]['throughput_per_sec']:9.1f}/s  p50 {results[name]['p50_ms']:8.2f}ms  "
+                  f"p95 {results[name]['p95_ms']:8.2f}ms  p99 {results[name]['p99_ms']:8.2f}ms  "
+                  f"errors {results[name]['errors']}")
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            await run_all(client)
+    else:
+        import main
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                await run_all(client)
+    return results
+
+
+# --- Reporting ---
+def compare(current: dict, baseline: dict):
+    print(f"\nChange vs baseline ({baseline['meta'].get('commit') or 'unknown commit'}):")
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("throughput_per_sec", "p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key):
+                changes.append(f"{key} {(result[key] - before[key]) / before[key]:+.1%}")
+        print(f"  {name:<20} " + "  ".join(changes))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="database to seed (default: a throwaway SQLite file)")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=10_000, help="conversations seeded in total (1k-1M)")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--scenarios", nargs="+", help="subset of scenarios to run")
+    parser.add_argument("--tagging-samples", type=int, default=200, help="conversations timed for tag extraction")
+    parser.add_argument("--no-seed-tagging", action="store_true", help="leave seeded conversations untagged")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="tokenizer processes for seeding")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="previous --output file to compare against")
+    args = parser.parse_args()
+
+    # Configure the app before it is imported.
+    os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db")
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    for name in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "JWT_SECRET_KEY"):
+        os.environ.setdefault(name, "load-benchmark")
+
+    import auth
+    import database
+    import migrate
+
+    migrate.run_migrations(database.engine)
+    print(f"Seeding {args.rows} conversations for {args.users} users on {database.engine.dialect.name}...")
+    seeded = seed(args.users, args.rows, args.seed, tag=not args.no_seed_tagging, workers=args.workers)
+    print(f"  inserted {seeded['inserted']} ({seeded['insert_per_sec']}/s), tagged at {seeded['tag_per_sec']}/s")
+
+    tokens = [auth.create_access_token(data={"sub": str(user_id)}) for user_id in seeded["user_ids"]]
+    results = asyncio.run(run_load(args, tokens, seeded["sample_ids"]))
+    results["tag_extraction"] = bench_tagging(args.tagging_samples, args.seed, seeded["user_ids"][0])
+    print(f"{'tag_extraction':<20} {results['tag_extraction']['throughput_per_sec']:9.1f}/s  "
+          f"p50 {results['tag_extraction']['p50_ms']:8.2f}ms  p95 {results['tag_extraction']['p95_ms']:8.2f}ms  "
+          f"p99 {results['tag_extraction']['p99_ms']:8.2f}ms")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "dialect": database.engine.dialect.name,
+            "target": args.url or "in-process",
+            "python": platform.python_version(),
+            "users": args.users,
+            "rows": args.rows,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "seeding": {key: value for key, value in seeded.items() if key not in ("user_ids", "sample_ids")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Optional compressed storage for prompt and response bodies.
+
+Responses with code blocks are often tens of KB, yet list, search and statistics queries never need
+them. With BODY_STORAGE=compressed, conversations of at least BODY_STORAGE_MIN_SIZE characters are
+saved with the full texts compressed in `conversation_bodies` (zstd when the `zstandard` package is
+installed, zlib otherwise), while the `conversations` row keeps only the first SNIPPET_LENGTH
+characters of the prompt, which is what the list snippet shows, and an empty response.
+
+The full texts are loaded only where they are needed: opening one conversation, /users/me,
+export, tagging and the maintenance scripts. Reads work whatever BODY_STORAGE is currently set to, so switching
+modes never makes stored rows unreadable. `python compress_bodies.py` moves existing rows.
+The search index is built from the full texts. Only the ILIKE fallback used on databases without
+an index is limited to the snippet.
+"""
+import importlib.util
+import os
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+import models
+
+BODY_STORAGE = os.getenv("BODY_STORAGE", "inline").lower()  # inline | compressed
+BODY_STORAGE_MIN_SIZE = int(os.getenv("BODY_STORAGE_MIN_SIZE", "2000"))  # characters of prompt + response
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+BODY_CODEC = os.getenv("BODY_CODEC", "").lower() or ("zstd" if importlib.util.find_spec("zstandard") else "zlib")
+
+
+def should_compress(prompt: str, response: str) -> bool:
+    return BODY_STORAGE == "compressed" and len(prompt) + len(response) >= BODY_STORAGE_MIN_SIZE
+
+
+def inline_values(prompt: str) -> dict:
+    """What stays in conversations.prompt/response for a conversation whose body is stored compressed."""
+    return {"prompt": prompt[:models.SNIPPET_LENGTH], "response": ""}
+
+
+def maybe_compressed(prompt: str, response: str) -> bool:
+    """Whether a row's inline texts could stand for a stored body; everything else is complete inline."""
+    return response == "" and len(prompt) <= models.SNIPPET_LENGTH
+
+
+def compress(text: str, codec: Optional[str] = None) -> bytes:
+    codec = codec or BODY_CODEC
+    data = text.encode("utf-8")
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("BODY_CODEC=zstd requires the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise ValueError(f"Unknown body codec: {codec}")
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("Reading zstd-compressed bodies requires the zstandard package (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown body codec: {codec}")
+
+
+# --- Reads ---
+def load_statement(conversation_ids: Iterable[int]):
+    body = models.ConversationBody
+    return select(body.conversation_id, body.codec, body.prompt, body.response).where(
+        body.conversation_id.in_(list(conversation_ids))
+    )
+
+
+def unpack(rows) -> Dict[int, Tuple[str, str]]:
+    """{conversation_id: (prompt, response)} from the rows of `load_statement`."""
+    return {
+        conversation_id: (decompress(codec, prompt), decompress(codec, response))
+        for conversation_id, codec, prompt, response in rows
+    }
+
+
+def load(db: Session, conversation_ids: Iterable[int]) -> Dict[int, Tuple[str, str]]:
+    """Full texts of the given conversations that have a stored body."""
+    conversation_ids = list(conversation_ids)
+    if not conversation_ids:
+        return {}
+    return unpack(db.execute(load_statement(conversation_ids)))
+
+
+def resolve(db: Session, rows: List[tuple]) -> List[tuple]:
+    """Replace the inline texts of (id, ..., prompt, response) tuples with the stored bodies."""
+    rows = [tuple(row) for row in rows]
+    texts = load(db, [row[0] for row in rows if maybe_compressed(row[-2], row[-1])])
+    return [(*row[:-2], *texts[row[0]]) if row[0] in texts else row for row in rows]
+
+
+def apply(conversations: Iterable[models.Conversation], texts: Dict[int, Tuple[str, str]]):
+    """Put full texts on loaded instances without marking them as changed."""
+    for conversation in conversations:
+        if conversation.id in texts:
+            prompt, response = texts[conversation.id]
+            set_committed_value(conversation, "prompt", prompt)
+            set_committed_value(conversation, "response", response)
+
+
+def attach(db: Session, conversations: List[models.Conversation]):
+    """Load the stored bodies of the given instances into their prompt and response."""
+    candidates = [c.id for c in conversations if maybe_compressed(c.prompt, c.response)]
+    apply(conversations, load(db, candidates))
+
+
+# --- Writes (none of them commit) ---
+def store(db: Session, texts: Dict[int, Tuple[str, str]], codec: Optional[str] = None) -> int:
+    """Save compressed bodies for {conversation_id: (prompt, response)}. Returns the compressed size in bytes."""
+    codec = codec or BODY_CODEC
+    rows = [
+        {"conversation_id": conversation_id, "codec": codec,
+         "prompt": compress(prompt, codec), "response": compress(response, codec)}
+        for conversation_id, (prompt, response) in texts.items()
+    ]
+    if rows:
+        db.execute(insert(models.ConversationBody), rows)
+    return sum(len(row["prompt"]) + len(row["response"]) for row in rows)
+
+
+def remove(db: Session, conversation_ids: List[int]):
+    db.execute(delete(models.ConversationBody).where(models.ConversationBody.conversation_id.in_(conversation_ids)))
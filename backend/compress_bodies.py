@@ -0,0 +1,104 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import random
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models
+import bodies
+import crud
+import migrate
+
+
+def measure_reads(db: Session, sample):
+    """Median and p95 milliseconds to open each sampled conversation (as GET /conversations/{id} does)."""
+    latencies = []
+    for conversation_id, owner_id in sample:
+        db.expunge_all()
+        started = time.perf_counter()
+        crud.get_conversation(db, owner_id, conversation_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+    db.rollback()
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0
+    return latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+
+def compress_bodies(chunk_size: int = 500, min_size: int = bodies.BODY_STORAGE_MIN_SIZE,
+                    codec: str = bodies.BODY_CODEC, samples: int = 200):
+    """
+    Move the bodies of existing conversations with at least `min_size` characters into
+    `conversation_bodies`, one chunk per transaction. Safe to rerun: moved rows are skipped.
+    Reports the bytes saved and the read latency of opening a conversation before and after.
+    """
+    migrate.run_migrations(engine)
+    if bodies.BODY_STORAGE != "compressed":
+        print("Note: BODY_STORAGE is not 'compressed', so new conversations will still be stored inline.")
+
+    db: Session = SessionLocal()
+    Conversation = models.Conversation
+    try:
+        size = func.length(Conversation.prompt) + func.length(Conversation.response)
+        eligible = (size >= min_size, Conversation.response != "")
+        total = db.query(Conversation).filter(*eligible).count()
+        if not total:
+            print("No conversations left to compress.")
+            return
+        print(f"Compressing {total} conversations of at least {min_size} characters with {codec}...")
+
+        sample_rows = db.execute(select(Conversation.id, Conversation.owner_id).where(*eligible)).all()
+        sample = random.Random(0).sample(sample_rows, min(samples, len(sample_rows)))
+        before = measure_reads(db, sample)
+
+        after_id, done, raw_bytes, stored_bytes = 0, 0, 0, 0
+        started = time.perf_counter()
+        while True:
+            rows = db.execute(
+                select(Conversation.id, Conversation.prompt, Conversation.response)
+                .where(Conversation.id > after_id, *eligible)
+                .order_by(Conversation.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            stored_bytes += bodies.store(db, {row.id: (row.prompt, row.response) for row in rows}, codec)
+            raw_bytes += sum(len(row.prompt.encode("utf-8")) + len(row.response.encode("utf-8")) for row in rows)
+            db.execute(update(Conversation), [{"id": row.id, **bodies.inline_values(row.prompt)} for row in rows])
+            db.commit()
+
+            after_id = rows[-1].id
+            done += len(rows)
+            rate = done / (time.perf_counter() - started)
+            print(f"Compressed {done}/{total} (last ID: {after_id}) - {rate:.1f} conversations/sec")
+
+        after = measure_reads(db, sample)
+
+        print(f"\nMoved {done} bodies: {raw_bytes / 1e6:.1f} MB of text stored as {stored_bytes / 1e6:.1f} MB "
+              f"({(1 - stored_bytes / raw_bytes) if raw_bytes else 0:.0%} smaller)")
+        print(f"Opening a conversation ({len(sample)} samples): "
+              f"p50 {before[0]:.2f} ms -> {after[0]:.2f} ms, p95 {before[1]:.2f} ms -> {after[1]:.2f} ms")
+        print("Run VACUUM (PostgreSQL: VACUUM FULL conversations) to return the freed space to the file system.")
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move large conversation bodies into compressed storage.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="conversations per transaction")
+    parser.add_argument("--min-size", type=int, default=bodies.BODY_STORAGE_MIN_SIZE,
+                        help="only move conversations with at least this many characters")
+    parser.add_argument("--codec", choices=["zlib", "zstd"], default=bodies.BODY_CODEC)
+    parser.add_argument("--samples", type=int, default=200, help="conversations opened to measure read latency")
+    args = parser.parse_args()
+
+    compress_bodies(chunk_size=args.chunk_size, min_size=args.min_size, codec=args.codec, samples=args.samples)
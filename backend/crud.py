@@ -1,14 +1,32 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List
+from sqlalchemy.orm import Session, load_only, selectinload, undefer
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from typing import Dict, Iterable, Optional, List, Set, Tuple
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+import bodies
+import instrumentation
 import models
+import rollups
 import schemas
+import search
+import similarity
+import tag_cache
+import tag_scoring
+import tokenizer
 
 # --- Stop Words Configuration ---
 # Add any words you want to exclude from keyword extraction here.
 korean_stop_words = set(["것", "수", "저", "등", "때", "그", "이", "것임", "있음", "대해", "언제", "설명", "근거", "예시"])
 english_stop_words = set(["i", "me", "my", "etc", "www", "com", "is", "a", "the", "of", "to", "in", "for", "on", "with"])
 
+# --- Pagination ---
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 
 def get_user_by_email(db: Session, email: str):
     """Fetch a single user by their email address."""
@@ -53,102 +71,540 @@ def get_or_create_user(db: Session, user_info: dict):
     db.refresh(new_user)
     return new_user
 
-def get_conversations(db: Session, user_id: int, query: Optional[str] = None, date: Optional[str] = None) -> List[models.Conversation]:
-    """Fetch conversations for a user, with optional search query and date filters."""
-    q = db.query(models.Conversation).filter(models.Conversation.owner_id == user_id)
+def content_hash(user_id: int, source: str, prompt: str, response: str) -> str:
+    """Fingerprint of a conversation's content. The timestamp is left out so re-sent turns match."""
+    payload = json.dumps([user_id, source, prompt, response], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def create_conversation(db: Session, user_id: int, conversation: schemas.ConversationCreate) -> Tuple[models.Conversation, bool]:
+    """
+    Idempotently save one conversation. Returns the stored row and whether it was newly created;
+    a duplicate of an existing conversation returns that row untouched.
+    """
+    [(conversation_id, created)] = create_conversations(db, user_id, [conversation])
+    db_conversation = db.query(models.Conversation).options(
+        selectinload(models.Conversation.tags)
+    ).filter(models.Conversation.id == conversation_id).one()
+    bodies.attach(db, [db_conversation])
+    return db_conversation, created
+
+def delete_conversation(db: Session, conversation: models.Conversation):
+    """Delete a conversation along with its tag links, search entry, stored body, rollup counts, term frequencies and related-index entry."""
+    owner_id, conversation_id = conversation.owner_id, conversation.id
+    rollups.record_tag_links(db, [(owner_id, tag.id) for tag in conversation.tags], sign=-1)
+    rollups.record_conversations(db, [(owner_id, conversation.source, conversation.conversation_timestamp)], sign=-1)
+    search.remove_conversations(db, [conversation_id])
+    tag_scoring.remove_documents(db, [conversation_id])
+    bodies.remove(db, [conversation_id])
+    db.delete(conversation)
+    db.commit()
+    similarity.index.remove(owner_id, [conversation_id])
+
+def create_conversations(db: Session, user_id: int, conversations: List[schemas.ConversationCreate]) -> List[Tuple[int, bool]]:
+    """
+    Idempotently save many conversations with one executemany.
+    Returns (id, created) per input item, in input order. Items with the same content as a stored
+    conversation, or as an earlier item in the list, map to that conversation with created=False.
+    Only new rows are indexed and counted in the rollups. Tagging happens later.
+    With BODY_STORAGE=compressed, large bodies go to `conversation_bodies` (see bodies.py).
+    """
+    if not conversations:
+        return []
+
+    hashes = [
+        content_hash(user_id, conversation.source, conversation.prompt, conversation.response)
+        for conversation in conversations
+    ]
+    # Dedupe within the request before touching the database; the first occurrence wins.
+    unique = {}
+    for digest, conversation in zip(hashes, conversations):
+        unique.setdefault(digest, conversation)
+
+    compressed = {digest for digest, conversation in unique.items() if bodies.should_compress(conversation.prompt, conversation.response)}
+    rows = []
+    for digest, conversation in unique.items():
+        row = {**conversation.dict(), "owner_id": user_id, "tagging_status": models.TAGGING_PENDING, "content_hash": digest}
+        if digest in compressed:
+            row.update(bodies.inline_values(conversation.prompt))
+        rows.append(row)
+    created_ids = _insert_new_conversations(db, rows)
+    bodies.store(db, {
+        conversation_id: (unique[digest].prompt, unique[digest].response)
+        for digest, conversation_id in created_ids.items() if digest in compressed
+    })
+
+    ids = dict(created_ids)
+    existing = unique.keys() - ids.keys()
+    if existing:
+        ids.update(db.execute(
+            select(models.Conversation.content_hash, models.Conversation.id)
+            .where(models.Conversation.content_hash.in_(existing))
+        ).all())
+
+    new_conversations = [(ids[digest], unique[digest]) for digest in created_ids]
+    with instrumentation.span("conversation.search_index"):
+        search.index_conversations(db, [
+            (conversation_id, user_id, search.build_document(conversation.prompt, conversation.response))
+            for conversation_id, conversation in new_conversations
+        ])
+    with instrumentation.span("conversation.rollups"):
+        rollups.record_conversations(db, [
+            (user_id, conversation.source, conversation.conversation_timestamp) for _, conversation in new_conversations
+        ])
+    with instrumentation.span("conversation.commit"):
+        db.commit()
+
+    first_seen = set()
+    results = []
+    for digest in hashes:
+        created = digest in created_ids and digest not in first_seen
+        first_seen.add(digest)
+        results.append((ids[digest], created))
+    return results
+
+def _insert_new_conversations(db: Session, rows: List[dict]) -> Dict[str, int]:
+    """Insert rows whose content_hash isn't stored yet. Returns {content_hash: id} for the rows inserted."""
+    table = models.Conversation.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = (
+            upsert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.content_hash])
+            .returning(table.c.content_hash, table.c.id)
+        )
+        return dict(db.execute(stmt, rows).all())
+
+    # Other backends: skip the hashes that already exist, then insert the rest.
+    stored = set(db.execute(
+        select(table.c.content_hash).where(table.c.content_hash.in_([row["content_hash"] for row in rows]))
+    ).scalars())
+    created = {}
+    for row in rows:
+        if row["content_hash"] not in stored:
+            created[row["content_hash"]] = db.execute(insert(table).values(**row)).inserted_primary_key[0]
+    return created
+
+def encode_cursor(payload: dict) -> str:
+    """Opaque, URL-safe pagination cursor."""
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Inverse of encode_cursor. Raises ValueError for anything it didn't produce."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def parse_time_bound(value: str, end: bool = False) -> datetime.datetime:
+    """
+    Parse a `from`/`to` filter value: a date (YYYY-MM-DD) or an ISO datetime (converted to UTC
+    if it has an offset). A date used as an end bound covers that whole day, so it becomes the
+    next midnight (exclusive).
+    Raises ValueError for anything else.
+    """
+    try:
+        if len(value) == 10:
+            day = datetime.date.fromisoformat(value)
+            return datetime.datetime.combine(day + datetime.timedelta(days=1) if end else day, datetime.time())
+        return schemas.naive_utc(datetime.datetime.fromisoformat(value))
+    except ValueError as e:
+        raise ValueError(f"Invalid date: {value}") from e
+
+
+def get_conversations(
+    db: Session,
+    user_id: int,
+    query: Optional[str] = None,
+    date: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    source: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+) -> Tuple[List[models.Conversation], Optional[str]]:
+    """
+    Fetch one page of conversations for a user, with optional search query and filters:
+    a single `date`, a `date_from`/`date_to` range (inclusive), a `source`, and `tags`
+    (every tag must be present). Dates are compared as plain ranges on conversation_timestamp
+    so the (owner_id, conversation_timestamp) index can be used.
+    Only the list columns and a prompt snippet are loaded; full bodies stay in the database.
+    Returns the page and the cursor for the next one (None on the last page).
+    Pages are ordered newest first and walked by (conversation_timestamp, id), or by rank
+    when searching. Raises ValueError for a malformed cursor or date.
+    """
+    Conversation = models.Conversation
+    q = _list_query(db, user_id)
+
+    if date:
+        date_from = date_to = date
+    if date_from:
+        q = q.filter(Conversation.conversation_timestamp >= parse_time_bound(date_from))
+    if date_to:
+        upper = parse_time_bound(date_to, end=True)
+        # A datetime `to` is inclusive; a day ends at the following midnight.
+        if len(date_to) == 10:
+            q = q.filter(Conversation.conversation_timestamp < upper)
+        else:
+            q = q.filter(Conversation.conversation_timestamp <= upper)
+    if source:
+        q = q.filter(Conversation.source == source)
+    for name in dict.fromkeys(tags or ()):
+        q = q.filter(Conversation.tags.any(models.Tag.name == name))
 
     if query:
+        # The filters go into the search itself, ahead of its result cap.
+        filtered = bool(date_from or date_to or source or tags)
+        scope = q.with_entities(Conversation.id).statement if filtered else None
+        ranked_ids = search.search_conversation_ids(db, user_id, query, scope=scope)
+        if ranked_ids is not None:
+            return _get_ranked_page(q, ranked_ids, limit, cursor)
+
+        # No search index on this database: fall back to a scan (compressed bodies only match on their snippet).
         search_query = f"%{query}%"
         q = q.filter(
             (
-                models.Conversation.prompt.ilike(search_query) |
-                models.Conversation.response.ilike(search_query) |
-                models.Conversation.tags.any(models.Tag.name.ilike(search_query))
+                Conversation.prompt.ilike(search_query) |
+                Conversation.response.ilike(search_query) |
+                Conversation.tags.any(models.Tag.name.ilike(search_query))
             )
         )
-    
-    if date:
-        q = q.filter(func.date(models.Conversation.conversation_timestamp) == date)
 
-    return q.order_by(models.Conversation.conversation_timestamp.desc()).all()
+    if cursor:
+        position = decode_cursor(cursor)
+        try:
+            after = (datetime.datetime.fromisoformat(position["ts"]), int(position["id"]))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        q = q.filter(tuple_(Conversation.conversation_timestamp, Conversation.id) < tuple_(*after))
+
+    conversations = q.order_by(Conversation.conversation_timestamp.desc(), Conversation.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(conversations) > limit:
+        last = conversations[limit - 1]
+        next_cursor = encode_cursor({"ts": last.conversation_timestamp.isoformat(), "id": last.id})
+    return conversations[:limit], next_cursor
+
+
+def _list_query(db: Session, user_id: int):
+    """The user's conversations with only the list columns, a prompt snippet and the tags loaded."""
+    Conversation = models.Conversation
+    return db.query(Conversation).options(
+        load_only(
+            Conversation.id, Conversation.source, Conversation.conversation_timestamp,
+            Conversation.created_at, Conversation.owner_id, Conversation.tagging_status
+        ),
+        undefer(Conversation.snippet),
+        selectinload(Conversation.tags),
+    ).filter(Conversation.owner_id == user_id)
+
+
+def _get_ranked_page(q, ranked_ids: List[int], limit: int, cursor: Optional[str]):
+    """Page through search results in rank order; the cursor is an offset into the ranking."""
+    try:
+        offset = int(decode_cursor(cursor)["offset"]) if cursor else 0
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    # The ranking is already filtered; slice it and load the page in rank order.
+    page_ids = ranked_ids[offset:offset + limit + 1]
+
+    conversations = q.filter(models.Conversation.id.in_(page_ids[:limit])).all()
+    rank = {conversation_id: i for i, conversation_id in enumerate(page_ids)}
+    conversations.sort(key=lambda conversation: rank[conversation.id])
+    next_cursor = encode_cursor({"offset": offset + limit}) if len(page_ids) > limit else None
+    return conversations, next_cursor
+
+def get_conversation(db: Session, user_id: int, conversation_id: int) -> Optional[models.Conversation]:
+    """Fetch one of the user's conversations with its tags and full texts."""
+    conversation = db.query(models.Conversation).options(
+        selectinload(models.Conversation.tags)
+    ).filter(
+        models.Conversation.id == conversation_id,
+        models.Conversation.owner_id == user_id
+    ).first()
+    if conversation is not None:
+        bodies.attach(db, [conversation])
+    return conversation
+
+def get_related_conversations(db: Session, user_id: int, conversation_id: int, k: int) -> Optional[List[Tuple[models.Conversation, float]]]:
+    """
+    The k conversations whose nouns overlap most with this one, as (conversation, similarity) pairs,
+    from the user's in-memory MinHash index. Returns None if the user has no such conversation,
+    and nothing until the conversation has been tagged.
+    """
+    row = db.execute(
+        select(models.Conversation.minhash)
+        .where(models.Conversation.id == conversation_id, models.Conversation.owner_id == user_id)
+    ).first()
+    if row is None:
+        return None
+    if row.minhash is None:
+        return []
+
+    with instrumentation.span("related.lookup"):
+        matches = similarity.index.get(db, user_id).query(row.minhash, k, exclude=conversation_id)
+    # Deleted elsewhere since the index was loaded: the query below simply doesn't return them.
+    conversations = {
+        conversation.id: conversation
+        for conversation in _list_query(db, user_id).filter(models.Conversation.id.in_([i for i, _ in matches]))
+    }
+    return [(conversations[i], score) for i, score in matches if i in conversations]
+
+def get_statistics_summary(db: Session, user_id: int):
+    """Total and per-source conversation counts for a user, read from the rollup table."""
+    by_source = dict(db.query(
+        models.UserSourceStat.source, models.UserSourceStat.count
+    ).filter(models.UserSourceStat.owner_id == user_id).all())
+    return {
+        "total_conversations": sum(by_source.values()),
+        "by_source": by_source
+    }
+
+def get_calendar(db: Session, user_id: int, month: str):
+    """Conversation counts per day of a month (YYYY-MM), read from the daily rollup. Raises ValueError for a bad month."""
+    try:
+        first = datetime.datetime.strptime(month, "%Y-%m").date()
+    except ValueError as e:
+        raise ValueError(f"Invalid month: {month}") from e
+    following = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    rows = db.query(models.UserDailyStat.day, models.UserDailyStat.count).filter(
+        models.UserDailyStat.owner_id == user_id,
+        models.UserDailyStat.day >= first,
+        models.UserDailyStat.day < following,
+    ).order_by(models.UserDailyStat.day).all()
+    return {"month": first.strftime("%Y-%m"), "days": [{"date": day.isoformat(), "count": count} for day, count in rows]}
 
 def get_tag_frequency(db: Session, user_id: int):
-    """Calculate the frequency of each tag for a given user."""
+    """Return the user's top 10 tags, read from the rollup table."""
     tag_frequency = db.query(
         models.Tag.name,
-        func.count(models.Conversation.id).label('count')
-    ).join(
-        models.conversation_tag_association, models.Tag.id == models.conversation_tag_association.c.tag_id
+        models.UserTagStat.count
     ).join(
-        models.Conversation, models.Conversation.id == models.conversation_tag_association.c.conversation_id
+        models.Tag, models.Tag.id == models.UserTagStat.tag_id
     ).filter(
-        models.Conversation.owner_id == user_id
-    ).group_by(
-        models.Tag.name
+        models.UserTagStat.owner_id == user_id
     ).order_by(
-        func.count(models.Conversation.id).desc()
+        models.UserTagStat.count.desc()
     ).limit(10).all() # Limit to top 10 tags
 
     return [{"name": name, "count": count} for name, count in tag_frequency]
 
 
-def get_or_create_tag(db: Session, tag_name: str) -> models.Tag:
-    """Get a tag by name, or create it if it doesn't exist."""
-    tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-    if tag:
-        return tag
-    
-    new_tag = models.Tag(name=tag_name)
-    db.add(new_tag)
-    db.commit()
-    db.refresh(new_tag)
-    return new_tag
+def resolve_tag_ids(db: Session, tag_names: Iterable[str]) -> Dict[str, int]:
+    """
+    Map tag names to ids in a constant number of queries, creating the missing tags.
+    Safe under concurrent writers: conflicting inserts are skipped and re-read.
+    Does not commit.
+    """
+    names = set(tag_names)
+    if not names:
+        return {}
 
+    tag_ids = dict(db.execute(select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(names))).all())
+    missing = names - tag_ids.keys()
+    if missing:
+        tag_ids.update(_insert_missing_tags(db, missing))
+        # Rows another transaction inserted first are not returned by ON CONFLICT DO NOTHING.
+        still_missing = missing - tag_ids.keys()
+        if still_missing:
+            tag_ids.update(db.execute(
+                select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(still_missing))
+            ).all())
+    return tag_ids
 
-def extract_and_add_tags(db: Session, conversation: models.Conversation):
-    """Extract keywords, prioritizing words from the prompt."""
-    import re
-    from collections import Counter
-    import nltk
-    from konlpy.tag import Okt
-
-    def get_nouns(text: str):
-        """Helper function to get both Korean nouns and English words from a text using KoNLPy."""
-        from konlpy.tag import Okt
-        okt = Okt()
-        
-        all_words = []
-        
-        # Use okt.pos to get words with their POS tags, normalizing and stemming
-        tagged_words = okt.pos(text, norm=True, stem=True)
-        
-        for word, pos in tagged_words:
-            # Collect Korean nouns (more than one character and not in stop words)
-            if pos == 'Noun' and len(word) > 1 and word not in korean_stop_words:
-                all_words.append(word)
-            # Collect English words (which are tagged as 'Alpha')
-            elif pos == 'Alpha' and len(word) > 2 and word.lower() not in english_stop_words:
-                all_words.append(word.lower())
-
-        return all_words
-
-    prompt_nouns = get_nouns(conversation.prompt)
-    response_nouns = get_nouns(conversation.response)
-
-    # Give higher weight to prompt nouns
-    weighted_nouns = (prompt_nouns * 5) + response_nouns
-
-    if not weighted_nouns:
+
+def _insert_missing_tags(db: Session, tag_names: Set[str]) -> Dict[str, int]:
+    """Insert tags that may already exist. Returns the ids of the rows this call created, when known."""
+    # Sorted so concurrent writers take the unique-index locks in the same order.
+    rows = [{"name": name} for name in sorted(tag_names)]
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        stmt = (
+            pg_insert(models.Tag).values(rows)
+            .on_conflict_do_nothing(index_elements=[models.Tag.name])
+            .returning(models.Tag.name, models.Tag.id)
+        )
+        return dict(db.execute(stmt).all())
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        # RETURNING needs SQLite 3.35+, so the caller re-reads the ids instead.
+        db.execute(sqlite_insert(models.Tag).values(rows).on_conflict_do_nothing(index_elements=[models.Tag.name]))
+        return {}
+
+    # Any other backend: one savepoint per tag so a duplicate doesn't abort the transaction.
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.Tag).values(**row))
+        except IntegrityError:
+            pass
+    return {}
+
+
+def link_tags(db: Session, tag_ids_by_conversation: Dict[int, Iterable[int]]):
+    """
+    Insert all missing conversation_tag rows in one statement. Pairs that already exist, including
+    ones a concurrent transaction inserted first, are skipped by the unique index. Does not commit.
+    """
+    assoc = models.conversation_tag_association
+    wanted = {
+        (conversation_id, tag_id)
+        for conversation_id, tag_ids in tag_ids_by_conversation.items()
+        for tag_id in tag_ids
+    }
+    if not wanted:
+        return
+
+    existing = db.execute(
+        select(assoc.c.conversation_id, assoc.c.tag_id)
+        .where(assoc.c.conversation_id.in_(list(tag_ids_by_conversation)))
+    ).all()
+    rows = [
+        {"conversation_id": conversation_id, "tag_id": tag_id}
+        for conversation_id, tag_id in sorted(wanted - {tuple(row) for row in existing})
+    ]
+    if not rows:
         return
+    rows = _insert_missing_links(db, rows)
 
-    word_counts = Counter(weighted_nouns)
-    tags_to_add = [word for word, _ in word_counts.most_common(5)]
+    owners = dict(db.execute(
+        select(models.Conversation.id, models.Conversation.owner_id)
+        .where(models.Conversation.id.in_({row["conversation_id"] for row in rows}))
+    ).all())
+    rollups.record_tag_links(db, [(owners.get(row["conversation_id"]), row["tag_id"]) for row in rows])
 
-    # --- Add tags to conversation ---
-    for word in tags_to_add:
-        tag = get_or_create_tag(db, word)
-        if tag not in conversation.tags:
-            conversation.tags.append(tag)
-    
-    db.commit()
 
+def _insert_missing_links(db: Session, rows: List[dict]) -> List[dict]:
+    """Insert conversation_tag rows that may already exist. Returns the rows actually inserted."""
+    assoc = models.conversation_tag_association
+    index_elements = [assoc.c.conversation_id, assoc.c.tag_id]
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        stmt = (
+            pg_insert(assoc).values(rows)
+            .on_conflict_do_nothing(index_elements=index_elements)
+            .returning(assoc.c.conversation_id, assoc.c.tag_id)
+        )
+        return [{"conversation_id": conversation_id, "tag_id": tag_id} for conversation_id, tag_id in db.execute(stmt)]
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        # SQLite has a single writer, so the rows checked by the caller are the ones inserted.
+        db.execute(sqlite_insert(assoc).values(rows).on_conflict_do_nothing(index_elements=index_elements))
+        return rows
+
+    # Any other backend: one savepoint per link so a duplicate doesn't abort the transaction.
+    inserted = []
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.execute(insert(assoc).values(**row))
+            inserted.append(row)
+        except IntegrityError:
+            pass
+    return inserted
+
+
+def replace_tags(db: Session, tag_ids_by_conversation: Dict[int, Iterable[int]]):
+    """Make the given tags the only ones on each conversation, so retagging drops stale tags. Does not commit."""
+    unlink_tags(db, list(tag_ids_by_conversation))
+    link_tags(db, tag_ids_by_conversation)
+
+
+def unlink_tags(db: Session, conversation_ids: List[int]):
+    """Remove every tag from the given conversations, keeping the tag rollups in step. Does not commit."""
+    assoc = models.conversation_tag_association
+    links = db.execute(
+        select(models.Conversation.owner_id, assoc.c.tag_id)
+        .join(models.Conversation, models.Conversation.id == assoc.c.conversation_id)
+        .where(assoc.c.conversation_id.in_(conversation_ids))
+    ).all()
+    db.execute(delete(assoc).where(assoc.c.conversation_id.in_(conversation_ids)))
+    rollups.record_tag_links(db, links, sign=-1)
+
+
+# Bump when the noun selection rules below change, so cached results are recomputed.
+NOUN_RULES_VERSION = 1
+
+
+def noun_cache_version() -> str:
+    """Everything that affects `tokenize_nouns` besides the text itself."""
+    stop_words = "\0".join(sorted(korean_stop_words)) + "\1" + "\0".join(sorted(english_stop_words))
+    stop_words_hash = hashlib.sha256(stop_words.encode("utf-8")).hexdigest()[:16]
+    return f"{tokenizer.ENGINE_NAME}:{NOUN_RULES_VERSION}:{stop_words_hash}"
+
+
+def noun_cache_key(text: str, version: Optional[str] = None) -> str:
+    return tag_cache.digest(version or noun_cache_version(), text)
+
+
+def tokenize_nouns(text: str, engine: Optional[str] = None) -> List[str]:
+    """Get both Korean nouns and English words from a text using the shared tokenizer (TOKENIZER_ENGINE by default)."""
+    all_words = []
+
+    # Use pos to get words with their POS tags, normalizing and stemming
+    tagged_words = tokenizer.pos(text, norm=True, stem=True, engine=engine)
+
+    for word, pos in tagged_words:
+        # Collect Korean nouns (more than one character and not in stop words)
+        if pos == 'Noun' and len(word) > 1 and word not in korean_stop_words:
+            all_words.append(word)
+        # Collect English words (which are tagged as 'Alpha')
+        elif pos == 'Alpha' and len(word) > 2 and word.lower() not in english_stop_words:
+            all_words.append(word.lower())
+
+    return all_words
+
+
+def get_nouns(text: str) -> List[str]:
+    """`tokenize_nouns` through the tag cache; repeated text skips the tokenizer."""
+    key = noun_cache_key(text)
+    nouns = tag_cache.cache.get(key)
+    if nouns is None:
+        nouns = tokenize_nouns(text)
+        tag_cache.cache.put(key, nouns)
+    return nouns
+
+
+def extract_and_add_tags(db: Session, conversation: models.Conversation):
+    """Extract keywords, prioritizing words from the prompt and weighting them by rarity in the user's archive."""
+    # Read before the commit expires the instance.
+    conversation_id, owner_id = conversation.id, conversation.owner_id
+    bodies.attach(db, [conversation])
+    with instrumentation.span("tagging.tokenize"):
+        prompt_nouns, response_nouns = get_nouns(conversation.prompt), get_nouns(conversation.response)
+
+    with instrumentation.span("tagging.score"):
+        tag_scoring.replace_documents(db, {conversation_id: (owner_id, prompt_nouns + response_nouns)})
+        [tags_to_add] = tag_scoring.rank([(owner_id, prompt_nouns, response_nouns)], db)
+    conversation.minhash = minhash = similarity.signature(prompt_nouns + response_nouns)
+
+    # --- Replace the conversation's tags (a retag drops the ones no longer picked) ---
+    with instrumentation.span("tagging.resolve_tags"):
+        tag_ids = resolve_tag_ids(db, tags_to_add)
+    with instrumentation.span("tagging.link_tags"):
+        replace_tags(db, {conversation_id: [tag_ids[word] for word in tags_to_add]})
+    with instrumentation.span("tagging.search_index"):
+        search.index_conversation(db, conversation, tags_to_add)
+
+    # The association rows were written with Core, so reload the relationship on next access.
+    db.expire(conversation, ["tags"])
+    with instrumentation.span("tagging.commit"):
+        db.commit()
+    similarity.index.update(owner_id, {conversation_id: minhash})
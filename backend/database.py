@@ -1,9 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
+import uuid
 from dotenv import load_dotenv
 
+import pool_metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -12,12 +16,86 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("No DATABASE_URL environment variable set")
 
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# --- Connection pool settings ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 keeps connections forever
+DB_POOL_PRE_PING = _env_flag("DB_POOL_PRE_PING", "true")     # test connections before use (stale-connection errors)
+# Running behind PgBouncer in transaction mode: never rely on server-side prepared statements.
+DB_PGBOUNCER = _env_flag("DB_PGBOUNCER", "false")
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.split("://", 1)[1] in ("", "/"))
+
+
+def pool_options(url: str, async_: bool = False) -> dict:
+    """create_engine keyword arguments for the pool, based on the DB_POOL_* settings."""
+    if _is_memory_sqlite(url):
+        return {}  # One shared connection; nothing to size.
+    return {
+        "poolclass": pool_metrics.MeteredAsyncQueuePool if async_ else pool_metrics.MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def connect_args(url: str) -> dict:
+    """Driver-specific connection arguments."""
+    if url.startswith("sqlite") and not url.startswith("sqlite+aiosqlite"):
+        # connect_args={"check_same_thread": False} is only needed for SQLite.
+        return {"check_same_thread": False}
+    if DB_PGBOUNCER and url.startswith("postgresql+asyncpg"):
+        # asyncpg prepares every statement; with PgBouncer the next transaction may run on another
+        # server connection, so disable both statement caches and use unique statement names.
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    # psycopg2 does not use server-side prepared statements, so it needs nothing here.
+    return {}
+
+
 engine = create_engine(
-    DATABASE_URL, 
-    # connect_args={"check_same_thread": False} is only needed for SQLite.
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+    DATABASE_URL,
+    connect_args=connect_args(DATABASE_URL),
+    **pool_options(DATABASE_URL)
 )
+pool_metrics.install(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+
+# --- Async engine (used by the API endpoints) ---
+def to_async_url(url: str) -> str:
+    """Swap the sync driver for its asyncio counterpart: asyncpg for PostgreSQL, aiosqlite for SQLite."""
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=connect_args(ASYNC_DATABASE_URL),
+    **pool_options(ASYNC_DATABASE_URL, async_=True)
+)
+pool_metrics.install(async_engine.sync_engine, "async")
+
+# expire_on_commit=False: attributes can't be lazily reloaded outside the session's greenlet.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
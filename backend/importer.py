@@ -0,0 +1,390 @@
+"""
+Bulk import of conversation archives.
+
+Supported inputs (plain, .gz, or the .zip downloaded from the provider):
+- ndjson:  one {"source", "prompt", "response", "conversation_timestamp"} object per line,
+           e.g. the output of GET /api/v1/conversations/export
+- chatgpt: `conversations.json` from a ChatGPT data export
+- gemini:  `MyActivity.json` for Gemini Apps from Google Takeout
+
+Files are parsed incrementally, one conversation at a time, and saved in chunks through
+`crud.create_conversations`, so re-importing a file skips everything already stored.
+Imported conversations are left 'pending'; tagging happens afterwards in a batch pass
+(the API's tagging workers, or `retag_conversations.py --pending-only`).
+
+Usage:
+    python importer.py --email me@example.com conversations.zip
+"""
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import gzip
+import html
+import io
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+import zipfile
+from typing import IO, Callable, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+import crud
+import database
+import schemas
+from auth_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".import_checkpoint.json")
+
+FORMATS = ("auto", "ndjson", "chatgpt", "gemini")
+# Members looked for inside a provider's .zip export
+ARCHIVE_MEMBERS = ("conversations.json", "MyActivity.json", "My Activity.json")
+
+
+# --- Reading ---
+def open_archive(path: str) -> IO[str]:
+    """Open an export as text, unpacking .gz and provider .zip files on the fly."""
+    if zipfile.is_zipfile(path):
+        # The open member keeps the underlying file open until it is closed itself.
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if os.path.basename(name) in ARCHIVE_MEMBERS]
+            if not names:
+                raise ValueError(f"{path} contains none of {', '.join(ARCHIVE_MEMBERS)}")
+            return io.TextIOWrapper(archive.open(names[0]), encoding="utf-8")
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+_ELEMENT_END = re.compile(r"[ \t\r\n]*[,\]]")
+
+
+def iter_json_array(fp: IO[str], read_size: int = 1 << 16) -> Iterator:
+    """Yield the elements of a top-level JSON array one by one without reading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill(size: int = read_size):
+        nonlocal buffer, pos, eof
+        data = fp.read(size)
+        eof = not data
+        buffer = buffer[pos:] + data
+        pos = 0
+
+    def skip(chars: str):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(" \t\r\n\ufeff")
+    if pos >= len(buffer) or buffer[pos] != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == "]":
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # Only trust an element once the "," or "]" after it has been read: a number cut off
+            # by the buffer ("3" of "333", "-4." of "-4.5") decodes as a shorter value.
+            complete = eof or _ELEMENT_END.match(buffer, end) is not None
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            fill(max(read_size, len(buffer)))  # The element continues past the buffer; read geometrically more.
+            continue
+        pos = end
+        yield value
+
+
+def iter_ndjson(fp: IO[str]) -> Iterator[dict]:
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+# --- Provider formats ---
+def _text(parts) -> str:
+    return "\n".join(part for part in parts if isinstance(part, str)).strip()
+
+
+def chatgpt_turns(conversation: dict) -> Iterator[dict]:
+    """Prompt/response pairs along the conversation's active branch."""
+    mapping = conversation.get("mapping") or {}
+    node_id = conversation.get("current_node")
+    thread = []
+    while node_id and node_id in mapping:
+        node = mapping[node_id]
+        if node.get("message"):
+            thread.append(node["message"])
+        node_id = node.get("parent")
+    thread.reverse()
+
+    prompt, prompt_time, response = None, None, []
+    for message in thread + [None]:
+        role = message and (message.get("author") or {}).get("role")
+        if message is None or role == "user":
+            if prompt and response:
+                yield {
+                    "source": "CHAT_GPT",
+                    "prompt": prompt,
+                    "response": "\n\n".join(response),
+                    "conversation_timestamp": prompt_time or conversation.get("create_time"),
+                }
+            if message is not None:
+                prompt = _text((message.get("content") or {}).get("parts") or [])
+                prompt_time = message.get("create_time")
+                response = []
+        elif role == "assistant" and prompt:
+            content = message.get("content") or {}
+            if content.get("content_type", "text") == "text":
+                text = _text(content.get("parts") or [])
+                if text:
+                    response.append(text)
+
+
+_TAG = re.compile(r"<[^>]+>")
+_BLOCK_END = re.compile(r"</(?:p|div|li|h[1-6]|pre|tr)>|<br\s*/?>", re.IGNORECASE)
+
+
+def _strip_html(value: str) -> str:
+    return html.unescape(_TAG.sub("", _BLOCK_END.sub("\n", value))).strip()
+
+
+def gemini_turns(activity: dict) -> Iterator[dict]:
+    """Takeout stores one prompt per activity, prefixed with "Prompted", and the reply as HTML."""
+    title = activity.get("title") or ""
+    if not title.startswith("Prompted "):
+        return
+    response = "\n\n".join(_strip_html(item.get("html", "")) for item in activity.get("safeHtmlItem") or [])
+    if response:
+        yield {
+            "source": "GEMINI",
+            "prompt": title[len("Prompted "):].strip(),
+            "response": response,
+            "conversation_timestamp": activity.get("time"),
+        }
+
+
+def detect_format(fp: IO[str]) -> str:
+    """Guess the format from the first element; `fp` must be seekable."""
+    head = fp.read(1 << 16).lstrip("\ufeff \t\r\n")
+    fp.seek(0)
+    if head.startswith("{"):
+        return "ndjson"
+    if re.search(r'"mapping"\s*:', head):
+        return "chatgpt"
+    if re.search(r'"(?:safeHtmlItem|header)"\s*:', head):
+        return "gemini"
+    raise ValueError("Could not detect the file format; pass it explicitly")
+
+
+def iter_conversations(fp: IO[str], fmt: str) -> Iterator[dict]:
+    """Raw conversation dicts from an export, in file order."""
+    if fmt == "ndjson":
+        return iter_ndjson(fp)
+    if fmt == "chatgpt":
+        return itertools.chain.from_iterable(chatgpt_turns(item) for item in iter_json_array(fp))
+    if fmt == "gemini":
+        return itertools.chain.from_iterable(gemini_turns(item) for item in iter_json_array(fp))
+    raise ValueError(f"Unknown format {fmt!r}")
+
+
+# --- Importing ---
+class ImportProgress:
+    """Counters for one import; `items` counts input conversations handled so far."""
+
+    def __init__(self):
+        self.status = "running"
+        self.items = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.finished: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "status": self.status,
+            "items": self.items,
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "error": self.error,
+            "elapsed_seconds": round(elapsed, 1),
+            "rate_per_second": round(self.items / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+def import_file(db: Session, user_id: int, path: str, fmt: str = "auto", chunk_size: int = IMPORT_CHUNK_SIZE,
+                skip: int = 0, progress: Optional[ImportProgress] = None,
+                on_chunk: Optional[Callable[[ImportProgress], None]] = None) -> ImportProgress:
+    """
+    Import an export file for a user, committing every `chunk_size` conversations.
+    `skip` resumes after that many input conversations; `on_chunk` runs after each commit.
+    """
+    progress = progress or ImportProgress()
+    with open_archive(path) as fp:
+        if fmt == "auto":
+            fmt = detect_format(fp)
+        items = itertools.islice(iter_conversations(fp, fmt), skip, None)
+        progress.items = skip
+
+        while True:
+            chunk = list(itertools.islice(items, chunk_size))
+            if not chunk:
+                break
+            valid: List[schemas.ConversationCreate] = []
+            for item in chunk:
+                try:
+                    # ChatGPT timestamps are epoch seconds, which pydantic also accepts.
+                    valid.append(schemas.ConversationCreate(**item))
+                except (ValidationError, TypeError):
+                    progress.invalid += 1
+            saved = crud.create_conversations(db, user_id, valid)
+            created = sum(1 for _, is_new in saved if is_new)
+            progress.imported += created
+            progress.duplicates += len(saved) - created
+            progress.items += len(chunk)
+            if on_chunk:
+                on_chunk(progress)
+
+    progress.status = "done"
+    progress.finished = time.time()
+    return progress
+
+
+# --- Background jobs for the API ---
+# Jobs stay visible for IMPORT_JOB_TTL seconds after their last progress, at most IMPORT_JOBS_SIZE of them.
+IMPORT_JOB_TTL = float(os.getenv("IMPORT_JOB_TTL", "3600"))
+IMPORT_JOBS_SIZE = int(os.getenv("IMPORT_JOBS_SIZE", "1000"))
+
+# job id -> (user id, ImportProgress)
+_jobs = TTLCache(maxsize=IMPORT_JOBS_SIZE, ttl=IMPORT_JOB_TTL)
+
+
+def start_import_job(user_id: int, path: str, fmt: str = "auto",
+                     on_done: Optional[Callable[[int], None]] = None) -> str:
+    """Import an uploaded file on a background thread and return a job id for `get_job`. Deletes the file afterwards."""
+    job_id = uuid.uuid4().hex
+    progress = ImportProgress()
+    _jobs.put(job_id, (user_id, progress))
+
+    def run():
+        db: Session = database.SessionLocal()
+        try:
+            # Each committed chunk renews the entry, so running jobs don't expire.
+            import_file(db, user_id, path, fmt=fmt, progress=progress,
+                        on_chunk=lambda _: _jobs.put(job_id, (user_id, progress)))
+            if on_done:
+                on_done(user_id)
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Import job %s failed", job_id)
+            progress.status = "failed"
+            progress.error = str(exc)
+            progress.finished = time.time()
+        finally:
+            db.close()
+            os.remove(path)
+            _jobs.put(job_id, (user_id, progress))
+
+    threading.Thread(target=run, name=f"import-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def get_job(user_id: int, job_id: str) -> Optional[dict]:
+    """Progress of one of the user's import jobs in this process, or None."""
+    owner_id, progress = _jobs.get(job_id) or (None, None)
+    if owner_id != user_id:
+        return None
+    return {"job_id": job_id, **progress.as_dict()}
+
+
+# --- CLI ---
+def load_checkpoint(path: str, source: str) -> int:
+    """Input conversations already committed for this source file, or 0."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+        return int(checkpoint["items"]) if checkpoint.get("source") == source else 0
+    except (FileNotFoundError, ValueError, KeyError):
+        return 0
+
+
+def save_checkpoint(path: str, source: str, items: int):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"source": source, "items": items}, f)
+    os.replace(tmp_path, path)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Import a ChatGPT/Gemini export or NDJSON file.")
+    parser.add_argument("path", help="export file (.json, .ndjson, .gz or the provider's .zip)")
+    parser.add_argument("--email", required=True, help="user who owns the imported conversations")
+    parser.add_argument("--format", default="auto", choices=FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="conversations per transaction")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args(argv)
+
+    import migrate
+    migrate.run_migrations(database.engine)
+
+    db: Session = database.SessionLocal()
+    try:
+        user = crud.get_user_by_email(db, args.email)
+        if user is None:
+            sys.exit(f"No user with email {args.email}; sign in once first.")
+
+        source = os.path.abspath(args.path)
+        skip = 0 if args.restart else load_checkpoint(args.checkpoint, source)
+        if skip:
+            print(f"Resuming after {skip} conversations.")
+
+        def report(progress: ImportProgress):
+            save_checkpoint(args.checkpoint, source, progress.items)
+            stats = progress.as_dict()
+            print(f"Read {stats['items']} - imported {stats['imported']}, duplicates {stats['duplicates']}, "
+                  f"invalid {stats['invalid']} - {stats['rate_per_second']:.1f} conversations/sec")
+
+        progress = import_file(db, user.id, args.path, fmt=args.format, chunk_size=args.chunk_size,
+                               skip=skip, on_chunk=report)
+        if os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+        print(f"\nImported {progress.imported} conversations ({progress.duplicates} already stored, "
+              f"{progress.invalid} invalid).")
+        print("Tag them with: python retag_conversations.py --pending-only")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Request timing, named spans and SQL statement counting.
+
+SQLAlchemy `before/after_cursor_execute` listeners add each statement and its duration to
+every counter active in the current context: the debug header's `count_queries`, the
+request trace, and any enclosing `span`. Endpoints use an `AsyncSession`; its statements,
+including those of sync crud code run through `AsyncSession.run_sync`, execute on the async
+engine's `sync_engine` in a greenlet that shares the request task's context, so statements
+issued by dependencies and the endpoint itself are all attributed to the request.
+
+Spans ("auth.jwt_decode", "tagging.tokenize", ...) feed process-wide histograms exported on
+/metrics, and are listed per request by the slow-request log.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Every counter collecting statements in the current context, innermost last.
+_active_counters: contextvars.ContextVar = contextvars.ContextVar("query_counters", default=())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counters = _active_counters.get()
+    if counters:
+        for counter in counters:
+            counter.count += 1
+        if context is not None:
+            context._instrumentation_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_instrumentation_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        for counter in _active_counters.get():
+            counter.seconds += elapsed
+
+
+def install(engine: Engine):
+    """Start counting statements executed through `engine`."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def _collect(counter: QueryCounter):
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+
+@contextmanager
+def count_queries():
+    """Count the statements executed inside the block: `with count_queries() as counter: ...`."""
+    with _collect(QueryCounter()) as counter:
+        yield counter
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Fail with AssertionError if the block executes more than `limit` statements."""
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {counter.count}")
+
+
+# --- Histograms ---
+class Histogram:
+    """Thread-safe cumulative histogram per label set, in the Prometheus model."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[Tuple[str, str], ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> List[Tuple[dict, List[Tuple[float, int]], float, int]]:
+        """[(labels, [(upper bound, cumulative count)], sum, count)] for every label set."""
+        with self._lock:
+            series = [(dict(key), list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        result = []
+        for labels, counts, total, count in series:
+            cumulative, running = [], 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                cumulative.append((bound, running))
+            result.append((labels, cumulative, total, count))
+        return result
+
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_SECONDS = Histogram(SECONDS_BUCKETS)  # labels: method, route, status
+SPAN_SECONDS = Histogram(SECONDS_BUCKETS)  # labels: span
+SPAN_STATEMENTS = Histogram(STATEMENT_BUCKETS)  # labels: span
+
+
+# --- Spans and request traces ---
+class RequestTrace:
+    def __init__(self):
+        self.queries = QueryCounter()
+        self.spans: List[Tuple[str, float, int, float]] = []  # (name, seconds, statements, SQL seconds)
+        self.duration = 0.0
+
+    def breakdown(self) -> str:
+        parts = [f"{name}={seconds * 1000:.1f}ms/{statements}q" for name, seconds, statements, _ in self.spans]
+        parts.append(f"sql={self.queries.seconds * 1000:.1f}ms/{self.queries.count}q")
+        return " ".join(parts)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+@contextmanager
+def trace_request():
+    """Collect the spans and statements of one request; `duration` is set on exit."""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        with _collect(trace.queries):
+            yield trace
+    finally:
+        trace.duration = time.perf_counter() - started
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    """Time a named stage and count its SQL statements; recorded in the histograms and the current request trace."""
+    started = time.perf_counter()
+    with _collect(QueryCounter()) as counter:
+        try:
+            yield counter
+        finally:
+            seconds = time.perf_counter() - started
+            SPAN_SECONDS.observe(seconds, span=name)
+            SPAN_STATEMENTS.observe(counter.count, span=name)
+            trace: Optional[RequestTrace] = _current_trace.get()
+            if trace is not None:
+                trace.spans.append((name, seconds, counter.count, counter.seconds))
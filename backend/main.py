@@ -1,27 +1,49 @@
+import datetime
+import json
+import logging
 import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
 
 # This line is for local development only, to allow OAuth over HTTP.
 # Do not use this in production.
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Body, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional
+from pydantic import ValidationError
 
 # Import modules
-import models
 import schemas
 import database
 import auth
+import auth_cache
 import crud
-import requests
+import async_crud
+import importer
+import tagging_worker
+import tokenizer
+import instrumentation
+import metrics
+import migrate
 from jose import JWTError, jwt
 
-# Create all database tables on startup
-models.Base.metadata.create_all(bind=database.engine)
+logger = logging.getLogger(__name__)
+
+# The schema is upgraded by running `python migrate.py` as a deploy step; startup only checks it
+# (an empty database is the exception: its schema is created at startup).
+# AUTO_MIGRATE=true applies migrations at startup instead, for a single-process local setup only:
+# concurrent workers would race on ALTER TABLE / CREATE INDEX.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
 
 app = FastAPI(
     title="Promptory API",
@@ -29,6 +51,11 @@ app = FastAPI(
     version="0.1.0"
 )
 
+# Upper bound on items accepted by POST /api/v1/conversations:batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+# Rows fetched per server-side cursor batch by GET /api/v1/conversations/export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+
 # Add CORS middleware
 frontend_url = os.getenv("FRONTEND_URL")
 extension_id = os.getenv("CHROME_EXTENSION_ID")
@@ -54,7 +81,91 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# --- Database Dependency ---
+# --- Metrics ---
+# Prometheus scrape endpoint, off unless METRICS_ENABLED=true.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+if METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        """Pool, auth cache and tagging queue metrics for this worker process."""
+        return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# --- Request Timing ---
+# Per-route latency histograms and per-stage spans, on when metrics are exported.
+# With SLOW_REQUEST_MS set, requests slower than that are logged with their stage breakdown.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+
+if METRICS_ENABLED or SLOW_REQUEST_MS > 0:
+    instrumentation.install(database.engine)
+    instrumentation.install(database.async_engine.sync_engine)
+
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        with instrumentation.trace_request() as trace:
+            response = await call_next(request)
+        # The route template keeps label cardinality bounded ("/api/v1/conversations/{conversation_id}").
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        instrumentation.REQUEST_SECONDS.observe(
+            trace.duration, method=request.method, route=route_path, status=str(response.status_code)
+        )
+        if SLOW_REQUEST_MS > 0 and trace.duration * 1000 >= SLOW_REQUEST_MS:
+            logger.warning("Slow request %s %s -> %s in %.1fms: %s", request.method, route_path,
+                           response.status_code, trace.duration * 1000, trace.breakdown())
+        return response
+
+# --- Query Count Debugging ---
+# With DEBUG_QUERY_COUNT=true every response carries the number of SQL statements it ran.
+DEBUG_QUERY_COUNT = os.getenv("DEBUG_QUERY_COUNT", "false").lower() in ("1", "true", "yes")
+
+if DEBUG_QUERY_COUNT:
+    instrumentation.install(database.engine)
+    instrumentation.install(database.async_engine.sync_engine)
+
+    @app.middleware("http")
+    async def add_query_count_header(request: Request, call_next):
+        with instrumentation.count_queries() as counter:
+            response = await call_next(request)
+        response.headers["X-DB-Query-Count"] = str(counter.count)
+        return response
+
+# --- Schema ---
+@app.on_event("startup")
+def apply_migrations():
+    if AUTO_MIGRATE:
+        migrate.run_migrations(database.engine)
+        return
+    # A brand-new database has no data to upgrade, so its schema is created here. Workers starting
+    # together may race to create it; a loser falls through to the check below.
+    if migrate.is_empty(database.engine):
+        try:
+            migrate.run_migrations(database.engine)
+            return
+        except SQLAlchemyError:
+            logger.warning("Creating the schema of an empty database failed; checking it again", exc_info=True)
+    # Fail at startup rather than on every query that touches a missing column.
+    pending = migrate.pending_changes(database.engine)
+    if pending:
+        raise RuntimeError(
+            f"The database schema is out of date (missing: {', '.join(pending)}). Run `python migrate.py` first."
+        )
+
+# --- Background Tagging ---
+@app.on_event("startup")
+def start_tagging_worker():
+    # One warm tokenizer per worker process, shared by all tagging threads. It loads in the
+    # background so requests are served right away; tagging jobs wait for it.
+    threading.Thread(target=tokenizer.init, name="tokenizer-warm-up", daemon=True).start()
+    tagging_worker.worker.start()
+    # Pick up conversations left 'pending' by a restart or a full queue.
+    tagging_worker.worker.submit_pending()
+
+@app.on_event("shutdown")
+def stop_tagging_worker():
+    tagging_worker.worker.stop()
+
+# --- Database Dependencies ---
 def get_db():
     db = database.SessionLocal()
     try:
@@ -62,29 +173,48 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Async session for endpoints that run on the event loop."""
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # --- Real Authentication Dependency ---
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> auth_cache.CachedUser:
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    try:
-        payload = jwt.decode(token, auth.JWT_SECRET_KEY, algorithms=[auth.ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
+
+    # Recently verified tokens skip JWT decoding.
+    user_id = auth_cache.tokens.get(token)
+    if user_id is None:
+        try:
+            with instrumentation.span("auth.jwt_decode"):
+                payload = jwt.decode(token, auth.JWT_SECRET_KEY, algorithms=[auth.ALGORITHM])
+            user_id: int = int(payload.get("sub"))
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        except (JWTError, ValueError, TypeError):
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except (JWTError, ValueError):
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+        # Never cache a token past its own expiry.
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        auth_cache.tokens.put(token, user_id, ttl=expires_in)
+
+    # Recently seen users skip the database lookup.
+    user = auth_cache.users.get(user_id)
     if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
+        with instrumentation.span("auth.user_lookup"):
+            db_user = await async_crud.get_user(db, user_id)
+        if db_user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = auth_cache.CachedUser(id=db_user.id, email=db_user.email)
+        auth_cache.users.put(user_id, user)
     return user
 
 # --- API Endpoints ---
@@ -98,7 +228,7 @@ def read_root():
 @app.get("/api/v1/auth/google")
 def auth_google():
     """Generate a redirect to Google's OAuth 2.0 login page."""
-    authorization_url, state = auth.flow.authorization_url(
+    authorization_url, state = auth.get_flow().authorization_url(
         access_type='offline',
         include_granted_scopes='true'
     )
@@ -116,10 +246,12 @@ def auth_google_callback(request: Request, db: Session = Depends(get_db)):
     #     raise HTTPException(status_code=400, detail="Invalid state parameter")
 
     # Exchange the authorization code for an access token
-    auth.flow.fetch_token(authorization_response=str(request.url))
-    credentials = auth.flow.credentials
+    flow = auth.get_flow()
+    flow.fetch_token(authorization_response=str(request.url))
+    credentials = flow.credentials
 
     # Get user info from Google
+    import requests
     user_info_response = requests.get(
         'https://www.googleapis.com/oauth2/v3/userinfo',
         headers={'Authorization': f'Bearer {credentials.token}'}
@@ -140,111 +272,262 @@ def auth_google_callback(request: Request, db: Session = Depends(get_db)):
 # --- User Endpoints ---
 
 @app.get("/api/v1/users/me", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
     """Fetch the currently logged-in user."""
-    return current_user
+    user = await async_crud.get_user_with_conversations(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
 
 # --- Conversation Endpoints (Now Protected) ---
 
-@app.get("/api/v1/conversations", response_model=List[schemas.Conversation])
-def read_conversations(
+@app.get("/api/v1/conversations", response_model=schemas.ConversationPage)
+async def read_conversations(
     q: Optional[str] = None,
     date: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    source: Optional[str] = None,
+    tag: Optional[List[str]] = Query(None),
+    limit: int = Query(crud.DEFAULT_PAGE_SIZE, ge=1, le=crud.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
-    """Retrieve conversations for the current user, with optional search and date filters."""
-    return crud.get_conversations(db=db, user_id=current_user.id, query=q, date=date)
+    """
+    Retrieve a page of conversations for the current user, with optional search and filters.
+    `from`/`to` take a date (YYYY-MM-DD, whole day) or an ISO datetime; `tag` may be repeated
+    and every tag must match. Pass the returned `next_cursor` back as `cursor` to get the next page.
+    """
+    try:
+        items, next_cursor = await async_crud.get_conversations(
+            db, user_id=current_user.id, query=q, date=date, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to, source=source, tags=tag
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# Declared before /conversations/{conversation_id} so "export" isn't parsed as an id.
+@app.get("/api/v1/conversations/export")
+async def export_conversations(
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    gzip: bool = False,
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
+    """
+    Download the current user's whole archive with tags, as NDJSON (one conversation per line)
+    or a JSON array, optionally gzip-compressed. The body is streamed as it is read.
+    """
+    user_id = current_user.id
+
+    async def chunks():
+        # The request's session is closed once the endpoint returns, so the stream opens its own.
+        async with database.AsyncSessionLocal() as db:
+            first = True
+            if format == "json":
+                yield b"["
+            async for rows in async_crud.export_conversations(db, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+                lines = [json.dumps(row, ensure_ascii=False, default=_json_default) for row in rows]
+                if format == "json":
+                    yield (("" if first else ",") + ",".join(lines)).encode("utf-8")
+                else:
+                    yield ("\n".join(lines) + "\n").encode("utf-8")
+                first = False
+            if format == "json":
+                yield b"]"
+
+    async def gzipped(body):
+        compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+        async for chunk in body:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    filename = f"promptory-export-{datetime.date.today():%Y%m%d}.{format}" + (".gz" if gzip else "")
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        gzipped(chunks()) if gzip else chunks(),
+        media_type="application/gzip" if gzip else media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.post("/api/v1/conversations/import", response_model=schemas.ImportJob, status_code=status.HTTP_202_ACCEPTED)
+async def import_conversations(
+    file: UploadFile = File(...),
+    format: str = Query("auto", pattern="^(auto|ndjson|chatgpt|gemini)$"),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
+    """
+    Import a ChatGPT/Gemini export or NDJSON file in the background.
+    Poll GET /api/v1/conversations/import/{job_id} for progress; tagging starts once the import is done.
+    """
+    def save_upload() -> str:
+        with tempfile.NamedTemporaryFile(prefix="promptory-import-", suffix=os.path.splitext(file.filename or "")[1],
+                                         delete=False) as f:
+            shutil.copyfileobj(file.file, f, length=1 << 20)
+            return f.name
+
+    path = await run_in_threadpool(save_upload)
+    job_id = importer.start_import_job(
+        current_user.id, path, fmt=format, on_done=lambda user_id: tagging_worker.worker.submit_pending(user_id)
+    )
+    return importer.get_job(current_user.id, job_id)
+
+@app.get("/api/v1/conversations/import/{job_id}", response_model=schemas.ImportJob)
+async def read_import_job(job_id: str, current_user: auth_cache.CachedUser = Depends(get_current_user)):
+    """Progress of an import started by this API process."""
+    job = importer.get_job(current_user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
 
 
 @app.get("/api/v1/conversations/{conversation_id}", response_model=schemas.Conversation)
-def read_conversation(
+async def read_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
     """Retrieve a single conversation by its ID."""
-    conversation = db.query(models.Conversation).filter(
-        models.Conversation.id == conversation_id,
-        models.Conversation.owner_id == current_user.id
-    ).first()
+    conversation = await async_crud.get_conversation(db, user_id=current_user.id, conversation_id=conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
 
+@app.get("/api/v1/conversations/{conversation_id}/related", response_model=schemas.RelatedConversations)
+async def read_related_conversations(
+    conversation_id: int,
+    k: int = Query(10, ge=1, le=crud.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
+    """
+    The `k` conversations most similar to this one by shared nouns, most similar first.
+    Empty until the conversation has been tagged.
+    """
+    related = await async_crud.get_related_conversations(
+        db, user_id=current_user.id, conversation_id=conversation_id, k=k
+    )
+    if related is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"items": [{"conversation": conversation, "similarity": score} for conversation, score in related]}
+
 @app.delete("/api/v1/conversations/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_conversation(
+async def delete_conversation(
     conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
     """Delete a conversation by its ID."""
-    conversation = db.query(models.Conversation).filter(
-        models.Conversation.id == conversation_id,
-        models.Conversation.owner_id == current_user.id
-    ).first()
+    conversation = await async_crud.get_conversation(db, user_id=current_user.id, conversation_id=conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    db.delete(conversation)
-    db.commit()
+    await async_crud.delete_conversation(db, conversation)
     return
 
 @app.get("/api/v1/statistics/summary")
-def get_statistics_summary(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_statistics_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
     """Get summary statistics for the current user."""
-    total_conversations = db.query(func.count(models.Conversation.id)).filter(models.Conversation.owner_id == current_user.id).scalar()
+    return await async_crud.get_statistics_summary(db, user_id=current_user.id)
 
-    by_source_query = db.query(
-        models.Conversation.source, func.count(models.Conversation.id)
-    ).filter(
-        models.Conversation.owner_id == current_user.id
-    ).group_by(
-        models.Conversation.source
-    ).all()
-
-    by_source = {source: count for source, count in by_source_query}
-
-    return {
-        "total_conversations": total_conversations or 0,
-        "by_source": by_source
-    }
+@app.get("/api/v1/statistics/calendar")
+async def get_calendar_statistics(
+    month: str = Query(..., description="YYYY-MM"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
+    """Per-day conversation counts for one month, for highlighting days in the date picker."""
+    try:
+        return await async_crud.get_calendar(db, user_id=current_user.id, month=month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/v1/statistics/tags")
-def get_tag_statistics(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_tag_statistics(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
     """Get tag frequency for the current user."""
-    tags = crud.get_tag_frequency(db=db, user_id=current_user.id)
+    tags = await async_crud.get_tag_frequency(db, user_id=current_user.id)
     return tags
 
 
 @app.post("/api/v1/conversations", response_model=schemas.Conversation, status_code=status.HTTP_201_CREATED)
-def create_conversation(
+async def create_conversation(
     conversation: schemas.ConversationCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
 ):
     """
     API-001: Receives conversation data from the Chrome extension and saves it.
     This endpoint is now protected and requires a valid JWT.
+    Tags are extracted by the background tagging worker, so the response comes back
+    with `tagging_status="pending"` and the tags show up shortly after.
+    Saving the same content again is idempotent: the stored conversation is returned with 200.
     """
-    db_conversation = models.Conversation(
-        **conversation.dict(),
-        owner_id=current_user.id
-    )
-    db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    with instrumentation.span("conversation.insert"):
+        db_conversation, created = await async_crud.create_conversation(db, user_id=current_user.id, conversation=conversation)
 
-    # Extract keywords and create tags
-    crud.extract_and_add_tags(db, db_conversation)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+        return db_conversation
 
-    # Refresh again to load the tags
-    db.refresh(db_conversation)
+    # Hand keyword extraction off to the worker pool. If the queue is full the
+    # conversation stays 'pending' and is picked up again later.
+    tagging_worker.worker.submit(db_conversation.id)
 
     return db_conversation
+
+
+@app.post("/api/v1/conversations:batch", response_model=schemas.ConversationBatchResult)
+async def create_conversations_batch(
+    items: List[Dict[str, Any]] = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth_cache.CachedUser = Depends(get_current_user)
+):
+    """
+    Save many conversations in one request (used by the extension's upload queue).
+    Items are validated one by one, so a bad item is reported without rejecting the rest.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BATCH_SIZE} conversations per batch"
+        )
+
+    results = [schemas.ConversationBatchItemResult(index=index) for index in range(len(items))]
+    valid_indexes, valid_items = [], []
+    for index, item in enumerate(items):
+        try:
+            valid_items.append(schemas.ConversationCreate(**item))
+            valid_indexes.append(index)
+        except ValidationError as e:
+            results[index].error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+
+    with instrumentation.span("conversation.insert_batch"):
+        saved = await async_crud.create_conversations(db, user_id=current_user.id, conversations=valid_items)
+    for index, (conversation_id, created) in zip(valid_indexes, saved):
+        results[index].id = conversation_id
+        results[index].duplicate = not created
+        if created:
+            tagging_worker.worker.submit(conversation_id)
+
+    return schemas.ConversationBatchResult(results=results)
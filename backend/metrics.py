@@ -0,0 +1,109 @@
+"""
+Prometheus text exposition for the /metrics endpoint.
+
+Collects request and span timings, connection pool, authentication cache, tag cache and tagging
+queue figures of this worker process.
+"""
+from typing import Iterable, List, Tuple
+
+import auth_cache
+import instrumentation
+import pool_metrics
+import tag_cache
+import tagging_worker
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _family(lines: List[str], name: str, kind: str, help_text: str, samples: Iterable[Tuple[dict, float]]):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+
+def _histogram(lines: List[str], name: str, help_text: str, histogram: instrumentation.Histogram):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, buckets, total, count in histogram.snapshot():
+        for bound, cumulative in buckets:
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+
+def render() -> str:
+    lines: List[str] = []
+
+    # --- Requests and spans ---
+    _histogram(lines, "promptory_http_request_duration_seconds", "Time to produce the response headers",
+               instrumentation.REQUEST_SECONDS)
+    _histogram(lines, "promptory_span_duration_seconds", "Time spent in a named stage",
+               instrumentation.SPAN_SECONDS)
+    _histogram(lines, "promptory_span_sql_statements", "SQL statements executed in a named stage",
+               instrumentation.SPAN_STATEMENTS)
+
+    # --- Connection pools ---
+    pools = pool_metrics.snapshot()
+    pool_counters = [
+        ("checkouts", "Connections checked out of the pool"),
+        ("checkins", "Connections returned to the pool"),
+        ("connects", "New DBAPI connections opened"),
+        ("invalidations", "Connections invalidated (e.g. failed pre-ping)"),
+        ("timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT"),
+    ]
+    for key, help_text in pool_counters:
+        _family(lines, f"promptory_db_pool_{key}_total", "counter", help_text,
+                [({"pool": name}, data[key]) for name, data in pools.items()])
+    lines.append("# HELP promptory_db_pool_wait_seconds Time spent waiting for a pooled connection")
+    lines.append("# TYPE promptory_db_pool_wait_seconds summary")
+    for name, data in pools.items():
+        labels = _format_labels({"pool": name})
+        lines.append(f"promptory_db_pool_wait_seconds_sum{labels} {data['wait_seconds_total']}")
+        lines.append(f"promptory_db_pool_wait_seconds_count{labels} {data['wait_count']}")
+    _family(lines, "promptory_db_pool_wait_seconds_max", "gauge", "Longest wait for a pooled connection",
+            [({"pool": name}, data["wait_seconds_max"]) for name, data in pools.items()])
+    for key, help_text in [
+        ("size", "Configured pool size"),
+        ("checked_out", "Connections currently in use"),
+        ("checked_in", "Idle connections in the pool"),
+        ("overflow", "Connections open beyond the pool size"),
+    ]:
+        _family(lines, f"promptory_db_pool_{key}", "gauge", help_text,
+                [({"pool": name}, data[key]) for name, data in pools.items() if key in data])
+
+    # --- Authentication cache ---
+    caches = auth_cache.stats()
+    for key, kind, help_text in [
+        ("hits", "counter", "Authentication cache hits"),
+        ("misses", "counter", "Authentication cache misses"),
+        ("evictions", "counter", "Entries evicted to stay under AUTH_CACHE_SIZE"),
+        ("size", "gauge", "Entries currently cached"),
+    ]:
+        name = f"promptory_auth_cache_{key}" + ("_total" if kind == "counter" else "")
+        _family(lines, name, kind, help_text,
+                [({"cache": cache}, caches[cache][key]) for cache in ("tokens", "users")])
+
+    # --- Tag cache ---
+    nouns = tag_cache.cache.stats()
+    _family(lines, "promptory_tag_cache_lookups_total", "counter", "Tag cache lookups by result",
+            [({"result": "hit"}, nouns["hits"] + nouns["db_hits"]),
+             ({"result": "miss"}, nouns["misses"] - nouns["db_hits"])])
+    _family(lines, "promptory_tag_cache_size", "gauge", "Noun lists held in memory",
+            [({}, nouns["size"])])
+
+    # --- Tagging queue ---
+    tagging = tagging_worker.worker.stats()
+    _family(lines, "promptory_tagging_queue_depth", "gauge", "Conversations waiting for tagging",
+            [({}, tagging["queue_depth"])])
+    _family(lines, "promptory_tagging_jobs_total", "counter", "Tagging jobs by outcome",
+            [({"outcome": key}, tagging[key]) for key in ("submitted", "rejected", "skipped", "done", "retried", "failed")])
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,159 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import logging
+
+from sqlalchemy import and_, delete, func, insert, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn
+
+import models
+import rollups
+import search
+
+logger = logging.getLogger(__name__)
+
+# Derived tables that must be filled from the existing conversations when they are first created.
+ROLLUP_TABLES = {"user_source_stats", "user_daily_stats", "user_tag_stats", "user_term_stats", "term_stats"}
+UNIQUE_LINK_INDEX = "ux_conversation_tag_conversation_tag"
+
+
+def _missing_columns(table, existing_columns) -> list:
+    return [column for column in table.columns if column.name not in existing_columns]
+
+
+def _add_missing_columns(engine: Engine, table, existing_columns) -> list:
+    """ALTER TABLE ... ADD COLUMN for model columns the table doesn't have yet."""
+    added = []
+    with engine.begin() as conn:
+        for column in _missing_columns(table, existing_columns):
+            if column.primary_key:
+                raise RuntimeError(f"Cannot add primary key column {table.name}.{column.name} to an existing table")
+            ddl = CreateColumn(column).compile(dialect=engine.dialect)
+            # Existing rows have no value yet, so a new column can only be NOT NULL with a server default.
+            if not column.nullable and column.server_default is None:
+                ddl = str(ddl).replace(" NOT NULL", "")
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _remove_duplicate_tag_links(engine: Engine) -> int:
+    """
+    Collapse repeated (conversation_id, tag_id) rows in conversation_tag to one, so the unique
+    index can be created. Returns the number of rows removed.
+    """
+    assoc = models.conversation_tag_association
+    pair = (assoc.c.conversation_id, assoc.c.tag_id)
+    removed = 0
+    with engine.begin() as conn:
+        duplicates = conn.execute(
+            select(*pair, func.count()).group_by(*pair).having(func.count() > 1)
+        ).all()
+        for conversation_id, tag_id, count in duplicates:
+            conn.execute(delete(assoc).where(and_(assoc.c.conversation_id == conversation_id, assoc.c.tag_id == tag_id)))
+            conn.execute(insert(assoc).values(conversation_id=conversation_id, tag_id=tag_id))
+            removed += count - 1
+    return removed
+
+
+def is_empty(engine: Engine) -> bool:
+    """True for a brand-new database that has none of the application's tables yet."""
+    return not set(models.Base.metadata.tables) & set(inspect(engine).get_table_names())
+
+
+def pending_changes(engine: Engine) -> list:
+    """
+    What `run_migrations` would change, without changing anything. Only reads the catalog, so
+    the API can check at startup that `python migrate.py` has been run against its database.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            pending.append(f"table {table.name}")
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        pending += [f"{table.name}.{column.name}" for column in _missing_columns(table, existing_columns)]
+        existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        pending += [f"index {index.name}" for index in table.indexes if index.name not in existing_indexes]
+    search_table = search.search_table(engine)
+    if search_table is not None and search_table not in existing_tables:
+        pending.append(f"table {search_table}")
+    return pending
+
+
+def run_migrations(engine: Engine = None) -> list:
+    """
+    Bring the database schema up to date with models.py and return what was changed.
+    Creates missing tables, columns and indexes and the search index, fills the search index and
+    statistics rollups when they are first created, and never drops anything.
+    """
+    if engine is None:
+        import database
+        engine = database.engine
+
+    changes = []
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        changes += _add_missing_columns(engine, table, existing_columns)
+
+    # Duplicate links would fail the unique index and have been counted twice in the tag rollups.
+    duplicate_links = 0
+    if "conversation_tag" in existing_tables and UNIQUE_LINK_INDEX not in {
+        index["name"] for index in inspector.get_indexes("conversation_tag")
+    }:
+        duplicate_links = _remove_duplicate_tag_links(engine)
+        if duplicate_links:
+            changes.append(f"removed {duplicate_links} duplicate conversation_tag rows")
+
+    # New tables, plus indexes on existing ones (checkfirst skips those already there).
+    models.Base.metadata.create_all(bind=engine)
+    changes += [f"table {name}" for name in sorted(set(inspect(engine).get_table_names()) - existing_tables)]
+    for table in models.Base.metadata.sorted_tables:
+        if table.name in existing_tables:
+            existing_indexes = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=engine, checkfirst=True)
+                    changes.append(f"index {index.name}")
+
+    search_table = search.search_table(engine)
+    search.create_search_schema(engine)
+
+    # Search and statistics read only from these, so a freshly created table would hide every
+    # existing conversation. Fill them right away when the database already has conversations.
+    if "conversations" in existing_tables:
+        with Session(bind=engine) as db:
+            if search_table is not None and search_table not in existing_tables:
+                indexed = max(search.reindex_all(db), default=0)
+                changes.append(f"indexed {indexed} conversations for search")
+            if ROLLUP_TABLES - existing_tables or duplicate_links:
+                rollups.rebuild(db)
+                db.commit()
+                changes.append("rebuilt statistics rollups")
+
+    for change in changes:
+        logger.info("Migrated: %s", change)
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema.")
+    parser.parse_args()
+
+    changes = run_migrations()
+    if changes:
+        print("Applied:\n  " + "\n  ".join(changes))
+    print("Schema is up to date.")
@@ -1,10 +1,19 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, ForeignKey, Table
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Text, LargeBinary, ForeignKey, Table, Index, func
+from sqlalchemy.orm import relationship, sessionmaker, column_property, deferred
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
 Base = declarative_base()
 
+# Conversation.tagging_status values
+TAGGING_PENDING = "pending"
+TAGGING_RUNNING = "running"  # Claimed by a tagging worker (see tagging_worker.py)
+TAGGING_DONE = "done"
+TAGGING_FAILED = "failed"
+
+# Length of the prompt preview returned by the conversation list
+SNIPPET_LENGTH = 200
+
 # Association Table for Many-to-Many relationship between Conversations and Tags
 conversation_tag_association = Table('conversation_tag', Base.metadata,
     Column('conversation_id', Integer, ForeignKey('conversations.id')),
@@ -26,14 +35,95 @@ class Conversation(Base):
     source = Column(String, index=True)
     prompt = Column(Text, nullable=False)
     response = Column(Text, nullable=False)
+    # Computed in SQL so list queries never load the full prompt
+    snippet = column_property(func.substr(prompt, 1, SNIPPET_LENGTH), deferred=True)
     conversation_timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     owner_id = Column(Integer, ForeignKey('users.id'))
+    # sha256 of (owner, source, prompt, response); re-sent turns are recognised and not stored twice
+    content_hash = Column(String(64), unique=True, index=True, nullable=True)
+    # Tagging runs in the background worker; rows that predate this column were tagged synchronously.
+    tagging_status = Column(String, nullable=False, index=True, default=TAGGING_PENDING, server_default=TAGGING_DONE)
+    # When a worker claimed the row; 'running' rows whose claim is older than TAGGING_CLAIM_TIMEOUT are requeued.
+    tagging_claimed_at = Column(DateTime, nullable=True)
+    # MinHash signature of the conversation's nouns for "related conversations"; set when tagged (see similarity.py)
+    minhash = deferred(Column(LargeBinary, nullable=True))
     owner = relationship("User", back_populates="conversations")
     tags = relationship("Tag", secondary=conversation_tag_association, back_populates="conversations")
 
+# Serves the dashboard list: WHERE owner_id = ? [AND conversation_timestamp BETWEEN ...]
+# ORDER BY conversation_timestamp DESC, id DESC
+Index('ix_conversations_owner_timestamp_id', Conversation.owner_id, Conversation.conversation_timestamp.desc(), Conversation.id)
+# The same list filtered by source
+Index('ix_conversations_owner_source_timestamp', Conversation.owner_id, Conversation.source, Conversation.conversation_timestamp.desc())
+# Tag filters: EXISTS (... WHERE conversation_id = ? AND tag_id = ?)
+Index('ix_conversation_tag_tag_conversation', conversation_tag_association.c.tag_id, conversation_tag_association.c.conversation_id)
+# One row per (conversation, tag): the conflict target of crud.link_tags. migrate.py removes older duplicates first.
+Index('ux_conversation_tag_conversation_tag', conversation_tag_association.c.conversation_id,
+      conversation_tag_association.c.tag_id, unique=True)
+
 class Tag(Base):
     __tablename__ = 'tags'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     conversations = relationship("Conversation", secondary=conversation_tag_association, back_populates="tags")
+
+# --- Statistics rollups ---
+# Per-user counters kept up to date by rollups.py, so the dashboard reads a handful of rows
+# instead of aggregating the whole conversation table.
+class UserSourceStat(Base):
+    __tablename__ = 'user_source_stats'
+    owner_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    source = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserDailyStat(Base):
+    __tablename__ = 'user_daily_stats'
+    owner_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserTagStat(Base):
+    __tablename__ = 'user_tag_stats'
+    owner_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    tag_id = Column(Integer, ForeignKey('tags.id'), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    tag = relationship("Tag")
+
+# Top tags per user: WHERE owner_id = ? ORDER BY count DESC
+Index('ix_user_tag_stats_owner_count', UserTagStat.owner_id, UserTagStat.count.desc())
+
+# Document frequencies for tag scoring, per user and across all users; see tag_scoring.py.
+# The empty term counts the documents themselves, per user only.
+class UserTermStat(Base):
+    __tablename__ = 'user_term_stats'
+    owner_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    term = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class TermStat(Base):
+    __tablename__ = 'term_stats'
+    term = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# Distinct candidate terms of each tagged conversation, so they can be counted out again
+class ConversationTerm(Base):
+    __tablename__ = 'conversation_terms'
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), primary_key=True)
+    term = Column(String, primary_key=True)
+
+
+# Full prompt/response of conversations stored compressed (BODY_STORAGE=compressed); see bodies.py
+class ConversationBody(Base):
+    __tablename__ = 'conversation_bodies'
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), primary_key=True)
+    codec = Column(String, nullable=False)  # zlib | zstd
+    prompt = Column(LargeBinary, nullable=False)
+    response = Column(LargeBinary, nullable=False)
+
+
+# Extracted noun lists keyed by text digest; see tag_cache.py (only used with TAG_CACHE_PERSIST)
+class NounCacheEntry(Base):
+    __tablename__ = 'noun_cache'
+    key = Column(String(64), primary_key=True)
+    nouns = Column(Text, nullable=False)  # JSON list
@@ -0,0 +1,112 @@
+"""
+Connection pool instrumentation.
+
+`MeteredQueuePool` / `MeteredAsyncQueuePool` time how long each checkout waits for a free
+connection (including timeouts), and pool events count checkouts, new connections and
+invalidations. `snapshot()` combines those counters with the pool's own size/overflow gauges.
+"""
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_count": self.wait_count,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+# Keyed by pool name ("sync", "async"); pools are recreated on dispose, stats survive that.
+_stats: Dict[str, PoolStats] = {}
+_pools: Dict[str, object] = {}
+
+
+def _stats_for(name: str) -> PoolStats:
+    return _stats.setdefault(name, PoolStats())
+
+
+class _WaitTimingMixin:
+    metrics_name = "default"
+
+    def _do_get(self):
+        _pools[self.metrics_name] = self
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            _stats_for(self.metrics_name).record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        _stats_for(self.metrics_name).record_wait(time.perf_counter() - start)
+        return connection
+
+
+class MeteredQueuePool(_WaitTimingMixin, QueuePool):
+    metrics_name = "sync"
+
+
+class MeteredAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def install(engine: Engine, name: str):
+    """Count checkouts, checkins, new connections and invalidations on the engine's pool."""
+    stats = _stats_for(name)
+    _pools[name] = engine.pool
+    event.listen(engine, "checkout", lambda *args: stats.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: stats.incr("checkins"))
+    event.listen(engine, "connect", lambda *args: stats.incr("connects"))
+    event.listen(engine, "invalidate", lambda *args: stats.incr("invalidations"))
+
+
+def snapshot() -> Dict[str, dict]:
+    """Counters plus current gauges for every instrumented pool."""
+    result = {}
+    for name, stats in _stats.items():
+        data = stats.as_dict()
+        pool = _pools.get(name)
+        if isinstance(pool, QueuePool):
+            data.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+            })
+        result[name] = data
+    return result
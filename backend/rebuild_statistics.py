@@ -0,0 +1,34 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import migrate
+import rollups
+
+
+def rebuild_statistics(user_id=None):
+    """Recompute the dashboard rollups and the tag-scoring term frequencies from the base tables."""
+    migrate.run_migrations(engine)
+    db: Session = SessionLocal()
+    try:
+        scope = f"user {user_id}" if user_id is not None else "all users"
+        print(f"Rebuilding statistics for {scope}...")
+        rollups.rebuild(db, user_id=user_id)
+        db.commit()
+        print("Statistics rebuilt successfully!")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill or repair the dashboard statistics rollups.")
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's statistics")
+    args = parser.parse_args()
+
+    rebuild_statistics(user_id=args.user_id)
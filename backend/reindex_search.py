@@ -0,0 +1,37 @@
+import sys
+import os
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+
+from sqlalchemy.orm import Session
+from database import SessionLocal, engine
+import models
+import search
+
+
+def reindex_all_conversations(chunk_size: int = 1000):
+    """Rebuild the full-text search index for every conversation (e.g. after first deploying it)."""
+    search.create_search_schema(engine)
+    db: Session = SessionLocal()
+    try:
+        total = db.query(models.Conversation).count()
+        print(f"Indexing {total} conversations...")
+
+        for done in search.reindex_all(db, chunk_size=chunk_size):
+            print(f"Indexed {done}/{total}")
+
+        print("\nSearch index rebuilt successfully!")
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the conversation full-text search index.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="conversations per transaction")
+    args = parser.parse_args()
+
+    reindex_all_conversations(chunk_size=args.chunk_size)
@@ -4,31 +4,216 @@ import os
 # Add the project root to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
+import bodies
 import crud
+import search
+import similarity
+import tag_cache
+import tag_scoring
+import tokenizer
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".retag_checkpoint.json")
+
+
+# --- Worker side (runs in the process pool) ---
+def _init_worker():
+    """Give every pool process its own warm Okt instance."""
+    tokenizer.init(prewarm=True)
+
+
+def _tokenize(text: str) -> List[str]:
+    # Lookups and writes to the tag cache happen in the parent process.
+    return crud.tokenize_nouns(text)
+
+
+# --- Tag cache ---
+def extract_chunk_nouns(rows: List[tuple], executor: Optional[ProcessPoolExecutor], workers: int):
+    """
+    Nouns for a chunk of (id, owner_id, prompt, response) rows.
+    Texts already in the tag cache skip the tokenizer; only the misses go to the pool.
+    Returns ({conversation_id: (prompt nouns, response nouns)}, cache_hits).
+    """
+    version = crud.noun_cache_version()
+    keys = {}
+    for _, _, prompt, response in rows:
+        for text in (prompt, response):
+            keys.setdefault(text, crud.noun_cache_key(text, version))
+
+    cached = tag_cache.cache.get_many(keys.values())
+    missing = [text for text, key in keys.items() if key not in cached]
+    if executor is not None:
+        tokenized = executor.map(_tokenize, missing, chunksize=max(1, len(missing) // (workers * 4)))
+    else:
+        tokenized = map(_tokenize, missing)
+    computed = {keys[text]: nouns for text, nouns in zip(missing, tokenized)}
+    tag_cache.cache.put_many(computed)
+
+    nouns = {**cached, **computed}
+    nouns_by_conversation = {
+        conversation_id: (nouns[keys[prompt]], nouns[keys[response]])
+        for conversation_id, _, prompt, response in rows
+    }
+    return nouns_by_conversation, len(keys) - len(missing)
+
+
+# --- Checkpointing ---
+# Full and --pending-only runs walk different sets of ids, so each keeps its own checkpoint.
+def checkpoint_path(path: str, pending_only: bool) -> str:
+    if not pending_only:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.pending{ext}"
+
+
+def _mode(pending_only: bool) -> str:
+    return "pending" if pending_only else "all"
+
+
+def load_checkpoint(path: str, pending_only: bool = False) -> int:
+    """Return the last fully committed conversation id of a run in the same mode, or 0 to start from scratch."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+        # Checkpoints written before runs were told apart come from full runs.
+        if checkpoint.get("mode", "all") != _mode(pending_only):
+            return 0
+        return int(checkpoint["last_id"])
+    except (FileNotFoundError, ValueError, KeyError, AttributeError):
+        return 0
+
+
+def save_checkpoint(path: str, last_id: int, pending_only: bool = False):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"mode": _mode(pending_only), "last_id": last_id}, f)
+    os.replace(tmp_path, path)
+
+
+# --- DB side ---
+def _scope(pending_only: bool):
+    """Conditions selecting the conversations to retag."""
+    if pending_only:
+        return [models.Conversation.tagging_status == models.TAGGING_PENDING]
+    return []
+
+
+def iter_chunks(db: Session, after_id: int, chunk_size: int, pending_only: bool = False) -> Iterable[List[tuple]]:
+    """Stream (id, owner_id, prompt, response) rows in id order, one keyset page at a time."""
+    while True:
+        rows = db.execute(
+            select(models.Conversation.id, models.Conversation.owner_id,
+                   models.Conversation.prompt, models.Conversation.response)
+            .where(models.Conversation.id > after_id, *_scope(pending_only))
+            .order_by(models.Conversation.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield bodies.resolve(db, rows)
+        after_id = rows[-1][0]
+
 
-def retag_all_conversations():
-    """Iterate through all conversations and apply the tagging logic."""
+def write_chunk(db: Session, rows: List[tuple], nouns_by_conversation: Dict[int, tuple]):
+    """
+    Replace the term frequencies, tags, search entries and related-conversation signatures of a whole
+    chunk of conversations and commit once.
+    The chunk is scored in one `tag_scoring.rank` call.
+    """
+    conversation_ids = list(nouns_by_conversation)
+    owners = {conversation_id: owner_id for conversation_id, owner_id, _, _ in rows}
+    tag_scoring.replace_documents(db, {
+        conversation_id: (owners[conversation_id], prompt_nouns + response_nouns)
+        for conversation_id, (prompt_nouns, response_nouns) in nouns_by_conversation.items()
+    })
+    ranked = tag_scoring.rank([
+        (owners[conversation_id], prompt_nouns, response_nouns)
+        for conversation_id, (prompt_nouns, response_nouns) in nouns_by_conversation.items()
+    ], db)
+    tags_by_conversation = dict(zip(conversation_ids, ranked))
+
+    tag_ids = crud.resolve_tag_ids(db, (name for names in tags_by_conversation.values() for name in names))
+    crud.replace_tags(db, {
+        conversation_id: [tag_ids[name] for name in names]
+        for conversation_id, names in tags_by_conversation.items()
+    })
+    search.index_conversations(db, [
+        (conversation_id, owner_id, search.build_document(prompt, response, tags_by_conversation[conversation_id]))
+        for conversation_id, owner_id, prompt, response in rows
+    ])
+    db.query(models.Conversation).filter(models.Conversation.id.in_(conversation_ids)).update(
+        {models.Conversation.tagging_status: models.TAGGING_DONE}, synchronize_session=False
+    )
+    db.execute(update(models.Conversation), [
+        {"id": conversation_id, "minhash": similarity.signature(prompt_nouns + response_nouns)}
+        for conversation_id, (prompt_nouns, response_nouns) in nouns_by_conversation.items()
+    ])
+    db.commit()
+
+
+def retag_all_conversations(chunk_size: int = 500, workers: int = os.cpu_count() or 1,
+                            checkpoint: str = DEFAULT_CHECKPOINT, restart: bool = False,
+                            pending_only: bool = False):
+    """
+    Retag every conversation in id-ordered chunks, resuming from the last checkpoint.
+    With `pending_only`, only conversations that were never tagged (e.g. fresh imports) are processed.
+    """
+    checkpoint = checkpoint_path(checkpoint, pending_only)
     db: Session = SessionLocal()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else None
     try:
-        print("Fetching all conversations...")
-        conversations = db.query(models.Conversation).all()
-        total = len(conversations)
-        print(f"Found {total} conversations to retag.")
-
-        for i, conversation in enumerate(conversations):
-            print(f"Processing conversation {i + 1}/{total} (ID: {conversation.id})...", end='')
-            # Clear existing tags to avoid duplicates if run multiple times
-            conversation.tags.clear()
-            crud.extract_and_add_tags(db, conversation)
-            print(" Done.")
+        after_id = 0 if restart else load_checkpoint(checkpoint, pending_only)
+        total = db.query(models.Conversation).filter(models.Conversation.id > after_id, *_scope(pending_only)).count()
+        if after_id:
+            print(f"Resuming after conversation ID {after_id}.")
+        print(f"Found {total} conversations to retag ({workers} worker(s), chunks of {chunk_size}).")
+
+        if executor is None:
+            _init_worker()
 
+        done, cache_hits = 0, 0
+        started = time.perf_counter()
+        for rows in iter_chunks(db, after_id, chunk_size, pending_only):
+            nouns_by_conversation, hits = extract_chunk_nouns(rows, executor, workers)
+            write_chunk(db, rows, nouns_by_conversation)
+            save_checkpoint(checkpoint, rows[-1][0], pending_only)
+
+            done += len(rows)
+            cache_hits += hits
+            rate = done / (time.perf_counter() - started)
+            print(f"Processed {done}/{total} (last ID: {rows[-1][0]}) - {rate:.1f} conversations/sec, "
+                  f"{cache_hits} texts from the tag cache")
+
+        # A full pass finished; the next run starts from the beginning again.
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
         print("\nRetagging process completed successfully!")
 
     finally:
+        if executor is not None:
+            executor.shutdown()
         db.close()
 
+
 if __name__ == "__main__":
-    retag_all_conversations()
+    parser = argparse.ArgumentParser(description="Re-extract tags for every stored conversation.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="conversations per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="tokenizer processes")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT,
+                        help="progress file used to resume (--pending-only runs use <name>.pending.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--pending-only", action="store_true", help="only tag conversations still pending")
+    args = parser.parse_args()
+
+    retag_all_conversations(chunk_size=args.chunk_size, workers=args.workers,
+                            checkpoint=args.checkpoint, restart=args.restart,
+                            pending_only=args.pending_only)
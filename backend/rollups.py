@@ -0,0 +1,149 @@
+"""
+Incrementally maintained statistics rollups.
+
+Every write path that adds or removes conversations or tag links calls into this module in the
+same transaction, so the counters in `user_source_stats`, `user_daily_stats` and `user_tag_stats`
+always match the base tables. The document frequencies used for tag scoring (`user_term_stats`,
+`term_stats`) are kept the same way from `conversation_terms`; documents are only counted per
+user, as an all-user row would be updated by every tagging transaction.
+`rebuild` recomputes them from scratch for backfills and repairs.
+None of the functions commit.
+"""
+import datetime
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import delete, distinct, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+import models
+
+# Term under which the term statistics count documents rather than a word.
+DOCUMENTS = ""
+
+
+def _apply(db: Session, model, key_names: Tuple[str, ...], deltas: Counter):
+    """Add `deltas` ({key tuple: delta}) to the model's counters, dropping counters that reach zero."""
+    deltas = {key: delta for key, delta in deltas.items() if delta and key[0] is not None}
+    if not deltas:
+        return
+    rows = [{**dict(zip(key_names, key)), "count": delta} for key, delta in deltas.items()]
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_names),
+            set_={"count": model.count + stmt.excluded.count},
+        )
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            keys = [getattr(model, name) == row[name] for name in key_names]
+            result = db.execute(update(model).where(*keys).values(count=model.count + row["count"]))
+            if result.rowcount == 0:
+                db.execute(insert(model).values(**row))
+
+    if any(delta < 0 for delta in deltas.values()):
+        scope = getattr(model, key_names[0])
+        db.execute(delete(model).where(scope.in_({key[0] for key, delta in deltas.items() if delta < 0}), model.count <= 0))
+
+
+def _day(timestamp: Optional[datetime.datetime]) -> datetime.date:
+    return (timestamp or datetime.datetime.utcnow()).date()
+
+
+def record_conversations(db: Session, conversations: Iterable[Tuple[int, str, datetime.datetime]], sign: int = 1):
+    """Count conversations given as (owner_id, source, conversation_timestamp); sign=-1 on delete."""
+    by_source, by_day = Counter(), Counter()
+    for owner_id, source, timestamp in conversations:
+        by_source[(owner_id, source)] += sign
+        by_day[(owner_id, _day(timestamp))] += sign
+    _apply(db, models.UserSourceStat, ("owner_id", "source"), by_source)
+    _apply(db, models.UserDailyStat, ("owner_id", "day"), by_day)
+
+
+def record_tag_links(db: Session, links: Iterable[Tuple[int, int]], sign: int = 1):
+    """Count tag links given as (owner_id, tag_id); sign=-1 when links are removed."""
+    by_tag = Counter()
+    for owner_id, tag_id in links:
+        by_tag[(owner_id, tag_id)] += sign
+    _apply(db, models.UserTagStat, ("owner_id", "tag_id"), by_tag)
+
+
+def record_terms(db: Session, terms: Iterable[Tuple[int, int, str]], sign: int = 1):
+    """Count the distinct terms of conversations given as (conversation_id, owner_id, term); sign=-1 on removal."""
+    by_user, by_term, documents = Counter(), Counter(), set()
+    for conversation_id, owner_id, term in terms:
+        by_user[(owner_id, term)] += sign
+        by_term[(term,)] += sign
+        documents.add((conversation_id, owner_id))
+    for _, owner_id in documents:
+        by_user[(owner_id, DOCUMENTS)] += sign
+    # Upsert in key order so concurrent taggers lock the shared rows in the same order.
+    _apply(db, models.UserTermStat, ("owner_id", "term"), Counter(dict(sorted(by_user.items()))))
+    _apply(db, models.TermStat, ("term",), Counter(dict(sorted(by_term.items()))))
+
+
+def rebuild(db: Session, user_id: Optional[int] = None):
+    """
+    Recompute all rollups (or one user's) from the conversation and tag tables.
+    The all-user `term_stats` are only rebuilt when no user is given.
+    """
+    Conversation = models.Conversation
+    ConversationTerm = models.ConversationTerm
+    assoc = models.conversation_tag_association
+
+    def scoped(stmt, column):
+        return stmt.where(column == user_id) if user_id is not None else stmt.where(column.isnot(None))
+
+    for model in (models.UserSourceStat, models.UserDailyStat, models.UserTagStat, models.UserTermStat):
+        stmt = delete(model)
+        db.execute(stmt.where(model.owner_id == user_id) if user_id is not None else stmt)
+
+    db.execute(insert(models.UserSourceStat).from_select(
+        ["owner_id", "source", "count"],
+        scoped(select(Conversation.owner_id, Conversation.source, func.count()), Conversation.owner_id)
+        .group_by(Conversation.owner_id, Conversation.source)
+    ))
+    day = func.date(Conversation.conversation_timestamp)
+    db.execute(insert(models.UserDailyStat).from_select(
+        ["owner_id", "day", "count"],
+        scoped(select(Conversation.owner_id, day, func.count()), Conversation.owner_id)
+        .group_by(Conversation.owner_id, day)
+    ))
+    db.execute(insert(models.UserTagStat).from_select(
+        ["owner_id", "tag_id", "count"],
+        scoped(
+            select(Conversation.owner_id, assoc.c.tag_id, func.count())
+            .join(assoc, assoc.c.conversation_id == Conversation.id),
+            Conversation.owner_id
+        ).group_by(Conversation.owner_id, assoc.c.tag_id)
+    ))
+
+    term_join = (ConversationTerm, ConversationTerm.conversation_id == Conversation.id)
+    db.execute(insert(models.UserTermStat).from_select(
+        ["owner_id", "term", "count"],
+        scoped(
+            select(Conversation.owner_id, ConversationTerm.term, func.count()).join(*term_join),
+            Conversation.owner_id
+        ).group_by(Conversation.owner_id, ConversationTerm.term)
+    ))
+    db.execute(insert(models.UserTermStat).from_select(
+        ["owner_id", "term", "count"],
+        scoped(
+            select(Conversation.owner_id, literal(DOCUMENTS), func.count(distinct(ConversationTerm.conversation_id)))
+            .join(*term_join),
+            Conversation.owner_id
+        ).group_by(Conversation.owner_id)
+    ))
+    if user_id is None:
+        db.execute(delete(models.TermStat))
+        db.execute(insert(models.TermStat).from_select(
+            ["term", "count"],
+            select(ConversationTerm.term, func.count()).group_by(ConversationTerm.term)
+        ))
@@ -1,7 +1,17 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Literal, Optional
 import datetime
 
+
+def naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+    Timestamps are stored in naive DateTime columns as UTC. Timezone-aware values (the extension
+    sends ISO strings ending in "Z") are converted; asyncpg refuses to bind them to those columns.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
 # --- Tag Schemas ---
 class TagBase(BaseModel):
     name: str
@@ -22,6 +32,11 @@ class ConversationBase(BaseModel):
     response: str
     conversation_timestamp: datetime.datetime
 
+    @field_validator("conversation_timestamp")
+    @classmethod
+    def conversation_timestamp_utc(cls, value: datetime.datetime) -> datetime.datetime:
+        return naive_utc(value)
+
 class ConversationCreate(ConversationBase):
     pass
 
@@ -29,11 +44,58 @@ class Conversation(ConversationBase):
     id: int
     owner_id: int
     created_at: datetime.datetime
+    tagging_status: str
     tags: List[Tag] = []
 
     class Config:
         from_attributes = True
 
+# Compact row for the conversation list; full bodies come from GET /conversations/{id}
+class ConversationListItem(BaseModel):
+    id: int
+    source: str
+    conversation_timestamp: datetime.datetime
+    created_at: datetime.datetime
+    snippet: str
+    tagging_status: str
+    tags: List[Tag] = []
+
+    class Config:
+        from_attributes = True
+
+class ConversationPage(BaseModel):
+    items: List[ConversationListItem]
+    next_cursor: Optional[str] = None
+
+class RelatedConversation(BaseModel):
+    conversation: ConversationListItem
+    similarity: float  # Estimated share of nouns the two conversations have in common (0-1)
+
+class RelatedConversations(BaseModel):
+    items: List[RelatedConversation]
+
+# --- Batch Ingestion Schemas ---
+class ConversationBatchItemResult(BaseModel):
+    index: int  # Position of the item in the request array
+    id: Optional[int] = None
+    duplicate: bool = False  # The content was already stored; `id` is the existing conversation
+    error: Optional[str] = None
+
+class ConversationBatchResult(BaseModel):
+    results: List[ConversationBatchItemResult]
+
+# --- Import Schemas ---
+class ImportJob(BaseModel):
+    job_id: str
+    status: Literal["running", "done", "failed"]
+    items: int  # Conversations read from the file so far
+    imported: int
+    duplicates: int
+    invalid: int
+    error: Optional[str] = None
+    elapsed_seconds: float
+    rate_per_second: float
+
 # --- User Schemas ---
 class UserBase(BaseModel):
     email: str
@@ -0,0 +1,198 @@
+"""
+Full-text search index for conversations.
+
+- PostgreSQL: a `conversation_search` table holding a `tsvector` per conversation, with a GIN index.
+- SQLite: an FTS5 virtual table `conversation_fts` whose rowid is the conversation id.
+
+Both index the same pre-tokenized document. Korean has no spaces between nouns and
+particles ("파이썬에서"), so Hangul runs are split into character bigrams and a query
+for "파이썬" becomes "파이" AND "이썬", which also matches "파이썬에서".
+Other dialects have no index; `search_conversation_ids` returns None and callers fall back to ILIKE.
+"""
+import re
+from collections import defaultdict
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, column, func, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import bodies
+import models
+
+# Upper bound on ranked ids returned for a single search.
+SEARCH_MAX_RESULTS = 1000
+
+_HANGUL_RUN = re.compile(r"[가-힣]+")
+_TOKEN = re.compile(r"[가-힣]+|[^\W_가-힣]+")
+
+
+def tokenize(value: str) -> List[str]:
+    """Lowercase words, with Hangul runs expanded into character bigrams."""
+    tokens = []
+    for word in _TOKEN.findall(value.lower()):
+        if _HANGUL_RUN.fullmatch(word) and len(word) > 1:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def build_document(prompt: str, response: str, tag_names: Iterable[str] = ()) -> str:
+    """The text stored in the index for one conversation."""
+    return " ".join(tokenize(" ".join([prompt, response, *tag_names])))
+
+
+def _dialect(bind) -> str:
+    return bind.dialect.name
+
+
+# --- Schema ---
+_SEARCH_TABLES = {"postgresql": "conversation_search", "sqlite": "conversation_fts"}
+
+
+def search_table(engine: Engine) -> Optional[str]:
+    """Name of the search table for the engine's dialect, or None if the dialect has no index."""
+    return _SEARCH_TABLES.get(_dialect(engine))
+
+
+def create_search_schema(engine: Engine):
+    """Create the search table and indexes for the engine's dialect, if missing."""
+    dialect = _dialect(engine)
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS conversation_search ("
+                " conversation_id INTEGER PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,"
+                " owner_id INTEGER NOT NULL,"
+                " document TSVECTOR NOT NULL)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_conversation_search_document"
+                " ON conversation_search USING GIN (document)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_conversation_search_owner_id ON conversation_search (owner_id)"
+            ))
+        elif dialect == "sqlite":
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS conversation_fts"
+                " USING fts5(document, owner_id UNINDEXED, tokenize='unicode61')"
+            ))
+
+
+# --- Index maintenance (callers commit) ---
+def index_conversations(db: Session, entries: Sequence[Tuple[int, int, str]]):
+    """Insert or replace index entries given as (conversation_id, owner_id, document)."""
+    if not entries:
+        return
+    dialect = _dialect(db.get_bind())
+    rows = [{"id": conversation_id, "owner_id": owner_id, "document": document}
+            for conversation_id, owner_id, document in entries]
+    if dialect == "postgresql":
+        db.execute(text(
+            "INSERT INTO conversation_search (conversation_id, owner_id, document)"
+            " VALUES (:id, :owner_id, to_tsvector('simple', :document))"
+            " ON CONFLICT (conversation_id) DO UPDATE SET document = EXCLUDED.document"
+        ), rows)
+    elif dialect == "sqlite":
+        db.execute(text("DELETE FROM conversation_fts WHERE rowid = :id"), rows)
+        db.execute(text(
+            "INSERT INTO conversation_fts (rowid, document, owner_id) VALUES (:id, :document, :owner_id)"
+        ), rows)
+
+
+def index_conversation(db: Session, conversation, tag_names: Iterable[str] = ()):
+    """Index a single ORM conversation."""
+    document = build_document(conversation.prompt, conversation.response, tag_names)
+    index_conversations(db, [(conversation.id, conversation.owner_id, document)])
+
+
+def remove_conversations(db: Session, conversation_ids: Sequence[int]):
+    """Drop index entries for deleted conversations."""
+    if not conversation_ids:
+        return
+    dialect = _dialect(db.get_bind())
+    rows = [{"id": conversation_id} for conversation_id in conversation_ids]
+    if dialect == "postgresql":
+        db.execute(text("DELETE FROM conversation_search WHERE conversation_id = :id"), rows)
+    elif dialect == "sqlite":
+        db.execute(text("DELETE FROM conversation_fts WHERE rowid = :id"), rows)
+
+
+# --- Backfill ---
+def reindex_all(db: Session, chunk_size: int = 1000) -> Iterator[int]:
+    """
+    Index every conversation, committing one chunk of `chunk_size` at a time.
+    Yields the number of conversations indexed so far after each chunk.
+    """
+    assoc = models.conversation_tag_association
+    after_id, done = 0, 0
+    while True:
+        rows = db.execute(
+            select(models.Conversation.id, models.Conversation.owner_id,
+                   models.Conversation.prompt, models.Conversation.response)
+            .where(models.Conversation.id > after_id)
+            .order_by(models.Conversation.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+
+        tag_names = defaultdict(list)
+        for conversation_id, name in db.execute(
+            select(assoc.c.conversation_id, models.Tag.name)
+            .join(models.Tag, models.Tag.id == assoc.c.tag_id)
+            .where(assoc.c.conversation_id.in_([row.id for row in rows]))
+        ):
+            tag_names[conversation_id].append(name)
+
+        index_conversations(db, [
+            (conversation_id, owner_id, build_document(prompt, response, tag_names[conversation_id]))
+            for conversation_id, owner_id, prompt, response in bodies.resolve(db, rows)
+        ])
+        db.commit()
+
+        after_id = rows[-1].id
+        done += len(rows)
+        yield done
+
+
+# --- Querying ---
+_conversation_search = table("conversation_search", column("conversation_id"), column("owner_id"), column("document"))
+_conversation_fts = table("conversation_fts", column("rowid"), column("owner_id"), column("rank"))
+
+
+def search_conversation_ids(db: Session, user_id: int, query: str, scope: Optional[Select] = None,
+                            limit: int = SEARCH_MAX_RESULTS) -> Optional[List[int]]:
+    """
+    Return the user's matching conversation ids, best match first.
+    Every query token must match; each one is a prefix match so results update while typing.
+    `scope` is a select of candidate conversation ids (e.g. the list filters); it is applied before
+    the `limit`, so filtered searches aren't cut down to the top matches of the unfiltered one.
+    Returns None when the database has no search index.
+    """
+    dialect = _dialect(db.get_bind())
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if dialect not in ("postgresql", "sqlite"):
+        return None
+    if not tokens:
+        return []
+
+    if dialect == "postgresql":
+        s = _conversation_search.c
+        tsquery = func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+        stmt = select(s.conversation_id).where(
+            s.owner_id == user_id, s.document.op("@@")(tsquery)
+        ).order_by(func.ts_rank(s.document, tsquery).desc(), s.conversation_id.desc())
+        conversation_id = s.conversation_id
+    else:
+        s = _conversation_fts.c
+        stmt = select(s.rowid).where(
+            literal_column("conversation_fts").op("MATCH")(" AND ".join(f'"{token}"*' for token in tokens)),
+            s.owner_id == user_id,
+        ).order_by(s.rank, s.rowid.desc())
+        conversation_id = s.rowid
+    if scope is not None:
+        stmt = stmt.where(conversation_id.in_(scope))
+    return list(db.scalars(stmt.limit(limit)))
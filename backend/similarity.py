@@ -0,0 +1,147 @@
+"""
+"Related conversations": MinHash signatures and a per-user similarity index.
+
+When a conversation is tagged, the set of its nouns (the candidate terms of tag scoring) is
+reduced to a MinHash signature, SIGNATURE_SIZE minimums of independent hash functions, stored
+in `conversations.minhash`. The share of positions where two signatures agree estimates the
+Jaccard similarity of the two noun sets.
+
+Lookups run against an in-memory index per user: all signatures as one (n, SIGNATURE_SIZE)
+uint32 matrix, so scoring a conversation against the whole archive is one vectorized comparison
+(a few milliseconds at 100k conversations). Indexes are loaded on first use, kept for
+RELATED_INDEX_USERS users per process, and updated in place when this process tags or deletes a
+conversation. They are reloaded after RELATED_INDEX_TTL seconds, so that writes from other
+processes (other API workers, the retag script) are picked up.
+"""
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+from auth_cache import TTLCache
+
+RELATED_INDEX_USERS = int(os.getenv("RELATED_INDEX_USERS", "32"))
+RELATED_INDEX_TTL = float(os.getenv("RELATED_INDEX_TTL", "300"))  # seconds
+
+SIGNATURE_SIZE = 64
+_PRIME = (1 << 31) - 1
+# Fixed seed: stored signatures are only comparable while the hash functions stay the same.
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, _PRIME, SIGNATURE_SIZE, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, SIGNATURE_SIZE, dtype=np.uint64)
+_DTYPE = np.dtype("<u4")
+
+
+def signature(terms: Iterable[str]) -> Optional[bytes]:
+    """MinHash signature of a set of terms, or None for an empty set."""
+    terms = set(terms)
+    if not terms:
+        return None
+    hashes = np.fromiter((zlib.crc32(term.encode("utf-8")) for term in terms), dtype=np.uint64, count=len(terms))
+    permuted = ((hashes % _PRIME)[:, None] * _A + _B) % _PRIME
+    return permuted.min(axis=0).astype(_DTYPE).tobytes()
+
+
+class UserIndex:
+    """The signatures of one user's conversations, with spare capacity for cheap appends."""
+
+    def __init__(self, ids: List[int], signatures: np.ndarray):
+        self.ids = np.array(ids, dtype=np.int64)
+        self.signatures = signatures
+        self.size = len(ids)
+        self.positions = {conversation_id: i for i, conversation_id in enumerate(ids)}
+        self._lock = threading.Lock()
+
+    def upsert(self, conversation_id: int, minhash: bytes):
+        row = np.frombuffer(minhash, dtype=_DTYPE)
+        with self._lock:
+            position = self.positions.get(conversation_id)
+            if position is None:
+                if self.size == len(self.ids):
+                    capacity = max(16, 2 * self.size)
+                    self.ids = np.resize(self.ids, capacity)
+                    self.signatures = np.resize(self.signatures, (capacity, SIGNATURE_SIZE))
+                position = self.positions[conversation_id] = self.size
+                self.ids[position] = conversation_id
+                self.size += 1
+            self.signatures[position] = row
+
+    def remove(self, conversation_id: int):
+        with self._lock:
+            position = self.positions.pop(conversation_id, None)
+            if position is None:
+                return
+            # Move the last row into the gap.
+            last = self.size - 1
+            if position != last:
+                self.ids[position] = self.ids[last]
+                self.signatures[position] = self.signatures[last]
+                self.positions[int(self.ids[position])] = position
+            self.size = last
+
+    def query(self, minhash: bytes, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """The k most similar conversations as (id, estimated Jaccard similarity), most similar first."""
+        row = np.frombuffer(minhash, dtype=_DTYPE)
+        with self._lock:
+            matches = np.count_nonzero(self.signatures[:self.size] == row, axis=1)
+            if exclude in self.positions:
+                matches[self.positions[exclude]] = 0
+            k = min(k, self.size)
+            if k <= 0:
+                return []
+            top = np.argpartition(-matches, k - 1)[:k]
+            top = top[np.argsort(-matches[top], kind="stable")]
+            top = top[matches[top] > 0]
+            return [(int(self.ids[i]), float(matches[i]) / SIGNATURE_SIZE) for i in top]
+
+
+class RelatedIndex:
+    """Per-process registry of loaded user indexes."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._users = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, db: Session, user_id: int) -> UserIndex:
+        index = self._users.get(user_id)
+        if index is None:
+            index = self._load(db, user_id)
+            self._users.put(user_id, index)
+        return index
+
+    def update(self, user_id: int, signatures: Dict[int, Optional[bytes]]):
+        """Apply new signatures (None removes a conversation) to the user's index, if it is loaded."""
+        index = self._users.get(user_id)
+        if index is None:
+            return
+        for conversation_id, minhash in signatures.items():
+            if minhash is None:
+                index.remove(conversation_id)
+            else:
+                index.upsert(conversation_id, minhash)
+
+    def remove(self, user_id: int, conversation_ids: Iterable[int]):
+        self.update(user_id, dict.fromkeys(conversation_ids))
+
+    def clear(self):
+        self._users.clear()
+
+    def stats(self) -> dict:
+        return self._users.stats()
+
+    @staticmethod
+    def _load(db: Session, user_id: int) -> UserIndex:
+        rows = db.execute(
+            select(models.Conversation.id, models.Conversation.minhash)
+            .where(models.Conversation.owner_id == user_id, models.Conversation.minhash.isnot(None))
+        ).all()
+        signatures = np.frombuffer(b"".join(minhash for _, minhash in rows), dtype=_DTYPE)
+        return UserIndex([conversation_id for conversation_id, _ in rows], signatures.reshape(-1, SIGNATURE_SIZE).copy())
+
+
+# One registry per process.
+index = RelatedIndex(maxsize=RELATED_INDEX_USERS, ttl=RELATED_INDEX_TTL)
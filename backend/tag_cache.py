@@ -0,0 +1,122 @@
+"""
+Cache of extracted noun lists, keyed by a digest of the text.
+
+Tokenizing with Okt is the expensive part of tagging. Retags of unchanged conversations and
+repeated prompts ("코드 리뷰해줘") produce the same nouns every time, so they are looked up here:
+- memory: a per-process LRU of TAG_CACHE_SIZE entries
+- database: the optional `noun_cache` table (TAG_CACHE_PERSIST), shared by the API workers and
+  the retag script and kept across restarts
+
+Keys come from `crud.noun_cache_key`, which mixes in the tokenizer engine and the stop words,
+so changing either simply stops matching the old entries.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select
+
+import database
+import models
+from auth_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+TAG_CACHE_SIZE = int(os.getenv("TAG_CACHE_SIZE", "50000"))  # entries; 0 disables the memory tier
+TAG_CACHE_PERSIST = os.getenv("TAG_CACHE_PERSIST", "false").lower() in ("1", "true", "yes")
+
+
+def digest(version: str, text: str) -> str:
+    """Cache key for `text` extracted under `version`."""
+    return hashlib.sha256(f"{version}\0{text}".encode("utf-8")).hexdigest()
+
+
+class NounCache:
+    """Memory LRU in front of an optional database table."""
+
+    def __init__(self, maxsize: int, persist: bool):
+        self.persist = persist
+        self._memory = TTLCache(maxsize=maxsize, ttl=float("inf"))
+        self.db_hits = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        """Return the cached noun lists for the keys that have one."""
+        found = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            nouns = self._memory.get(key)
+            if nouns is None:
+                missing.append(key)
+            else:
+                found[key] = nouns
+        if missing and self.persist:
+            stored = self._load(missing)
+            for key, nouns in stored.items():
+                self._memory.put(key, nouns)
+            self.db_hits += len(stored)
+            found.update(stored)
+        return found
+
+    def get(self, key: str) -> Optional[List[str]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: Dict[str, List[str]]):
+        for key, nouns in entries.items():
+            self._memory.put(key, nouns)
+        if entries and self.persist:
+            self._store(entries)
+
+    def put(self, key: str, nouns: List[str]):
+        self.put_many({key: nouns})
+
+    def clear(self):
+        """Drop the memory tier. Persistent entries stay valid until their version changes."""
+        self._memory.clear()
+
+    def stats(self) -> dict:
+        return {**self._memory.stats(), "db_hits": self.db_hits, "persist": self.persist}
+
+    # --- Persistent tier; failures only cost a cache miss ---
+    def _load(self, keys: List[str]) -> Dict[str, List[str]]:
+        db = database.SessionLocal()
+        try:
+            rows = db.execute(
+                select(models.NounCacheEntry.key, models.NounCacheEntry.nouns)
+                .where(models.NounCacheEntry.key.in_(keys))
+            )
+            return {key: json.loads(nouns) for key, nouns in rows}
+        except Exception:
+            logger.warning("Reading the noun cache table failed", exc_info=True)
+            return {}
+        finally:
+            db.close()
+
+    def _store(self, entries: Dict[str, List[str]]):
+        table = models.NounCacheEntry.__table__
+        rows = [{"key": key, "nouns": json.dumps(nouns, ensure_ascii=False)} for key, nouns in entries.items()]
+        db = database.SessionLocal()
+        try:
+            dialect = db.get_bind().dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                if dialect == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert as upsert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert as upsert
+                db.execute(upsert(table).on_conflict_do_nothing(index_elements=[table.c.key]), rows)
+            else:
+                stored = set(db.execute(select(table.c.key).where(table.c.key.in_(list(entries)))).scalars())
+                new_rows = [row for row in rows if row["key"] not in stored]
+                if new_rows:
+                    db.execute(insert(table), new_rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.warning("Writing the noun cache table failed", exc_info=True)
+        finally:
+            db.close()
+
+
+# One cache per process.
+cache = NounCache(maxsize=TAG_CACHE_SIZE, persist=TAG_CACHE_PERSIST)
@@ -0,0 +1,216 @@
+"""
+Corpus-aware tag scoring.
+
+Picking the most frequent nouns lets words that appear in nearly every conversation ("코드",
+"python") top every tag list. Candidates are instead weighted by how rare they are in the
+owner's archive and across all users:
+
+    tf     = 5 * count in the prompt + count in the response
+    idf    = ln(1 + (N - df + 0.5) / (df + 0.5)), mixing the owner's and the global statistics
+             TAG_SCORING_USER_WEIGHT : 1 - TAG_SCORING_USER_WEIGHT
+    bm25   = idf * tf * (k1 + 1) / (tf + k1)
+    tfidf  = idf * tf
+
+Tags are ranked within one conversation, and BM25's document length normalisation would scale all
+of its candidates alike, so it is left out. TAG_SCORING=frequency keeps the plain frequency ranking.
+
+Document frequencies count each tagged conversation's distinct candidate terms, which are stored
+in `conversation_terms` so that deletes and retags can subtract them again (see `rollups.record_terms`).
+The all-user document count is the sum of the per-user counts rather than a shared row every tagging
+transaction would update; it is re-summed at most every TAG_SCORING_DOCUMENTS_TTL seconds.
+`rank` scores a whole chunk of conversations at once: every (conversation, term) pair becomes one
+element of flat NumPy arrays, and tf, idf and the per-conversation top 5 are array operations.
+"""
+import os
+import time
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+import models
+import rollups
+
+TAG_SCORING = os.getenv("TAG_SCORING", "bm25").lower()  # bm25 | tfidf | frequency
+TAG_SCORING_USER_WEIGHT = float(os.getenv("TAG_SCORING_USER_WEIGHT", "0.5"))
+TAG_SCORING_DOCUMENTS_TTL = float(os.getenv("TAG_SCORING_DOCUMENTS_TTL", "60"))
+
+METHODS = ("bm25", "tfidf", "frequency")
+MAX_TAGS = 5
+PROMPT_WEIGHT = 5
+BM25_K1 = 1.2
+
+# Terms per IN (...) list when loading frequencies; keeps SQLite under its bound parameter limit.
+_LOOKUP_BATCH = 5000
+
+# (owner_id, prompt nouns, response nouns)
+Document = Tuple[Optional[int], Sequence[str], Sequence[str]]
+
+
+# (count, time.monotonic() when summed) of the all-user document count
+_global_documents = (0.0, float("-inf"))
+
+
+# --- Document frequencies ---
+def global_documents(db: Session) -> float:
+    """Documents across all users: the sum of the per-user counts, cached for TAG_SCORING_DOCUMENTS_TTL."""
+    global _global_documents
+    count, summed_at = _global_documents
+    now = time.monotonic()
+    if now - summed_at >= TAG_SCORING_DOCUMENTS_TTL:
+        count = float(db.scalar(
+            select(func.coalesce(func.sum(models.UserTermStat.count), 0))
+            .where(models.UserTermStat.term == rollups.DOCUMENTS)
+        ))
+        _global_documents = (count, now)
+    return count
+
+
+def replace_documents(db: Session, documents: Dict[int, Tuple[int, Iterable[str]]]):
+    """
+    Record the candidate terms of tagged conversations ({conversation_id: (owner_id, terms)}),
+    replacing whatever was counted for them before. Does not commit.
+    """
+    remove_documents(db, list(documents))
+    rows = [
+        {"conversation_id": conversation_id, "term": term}
+        for conversation_id, (_, terms) in documents.items()
+        for term in sorted(set(terms))
+    ]
+    if not rows:
+        return
+    db.execute(insert(models.ConversationTerm), rows)
+    owners = {conversation_id: owner_id for conversation_id, (owner_id, _) in documents.items()}
+    rollups.record_terms(db, [(row["conversation_id"], owners[row["conversation_id"]], row["term"]) for row in rows])
+
+
+def remove_documents(db: Session, conversation_ids: List[int]):
+    """Take the given conversations out of the document frequencies. Does not commit."""
+    if not conversation_ids:
+        return
+    terms = db.execute(
+        select(models.ConversationTerm.conversation_id, models.Conversation.owner_id, models.ConversationTerm.term)
+        .join(models.Conversation, models.Conversation.id == models.ConversationTerm.conversation_id)
+        .where(models.ConversationTerm.conversation_id.in_(conversation_ids))
+    ).all()
+    if not terms:
+        return
+    db.execute(delete(models.ConversationTerm).where(models.ConversationTerm.conversation_id.in_(conversation_ids)))
+    rollups.record_terms(db, terms, sign=-1)
+
+
+class Frequencies:
+    """Document frequencies of a chunk's vocabulary, as arrays indexed by owner and term index."""
+
+    def __init__(self, owners: Dict[int, int], vocab: Dict[str, int]):
+        self.owners = owners
+        self.vocab = vocab
+        self.user_documents = np.zeros(len(owners))
+        self.user_keys = np.zeros(0, dtype=np.int64)  # owner index * len(vocab) + term index, sorted
+        self.user_df = np.zeros(0)
+        self.global_documents = 0.0
+        self.global_df = np.zeros(len(vocab))
+
+    @classmethod
+    def load(cls, db: Session, owners: Dict[int, int], vocab: Dict[str, int]) -> "Frequencies":
+        frequencies = cls(owners, vocab)
+        terms = [rollups.DOCUMENTS, *vocab]
+        user_rows, global_rows = [], []
+        for start in range(0, len(terms), _LOOKUP_BATCH):
+            batch = terms[start:start + _LOOKUP_BATCH]
+            user_rows += db.execute(
+                select(models.UserTermStat.owner_id, models.UserTermStat.term, models.UserTermStat.count)
+                .where(models.UserTermStat.owner_id.in_(list(owners)), models.UserTermStat.term.in_(batch))
+            ).all()
+            global_rows += db.execute(
+                select(models.TermStat.term, models.TermStat.count)
+                .where(models.TermStat.term.in_(batch), models.TermStat.term != rollups.DOCUMENTS)
+            ).all()
+
+        for term, count in global_rows:
+            frequencies.global_df[vocab[term]] = count
+        # The cached total may lag the live term counts; no term is in more documents than there are.
+        frequencies.global_documents = max(global_documents(db), float(frequencies.global_df.max(initial=0)))
+
+        keys, counts = [], []
+        for owner_id, term, count in user_rows:
+            if term == rollups.DOCUMENTS:
+                frequencies.user_documents[owners[owner_id]] = count
+            else:
+                keys.append(owners[owner_id] * len(vocab) + vocab[term])
+                counts.append(count)
+        order = np.argsort(keys)
+        frequencies.user_keys = np.asarray(keys, dtype=np.int64)[order]
+        frequencies.user_df = np.asarray(counts, dtype=float)[order]
+        return frequencies
+
+    def idf(self, owner_index: np.ndarray, term_index: np.ndarray) -> np.ndarray:
+        """Blended idf for each (owner index, term index) pair."""
+        keys = owner_index * len(self.vocab) + term_index
+        user_df = np.zeros(len(keys))
+        if len(self.user_keys):
+            found = np.minimum(np.searchsorted(self.user_keys, keys), len(self.user_keys) - 1)
+            hit = self.user_keys[found] == keys
+            user_df[hit] = self.user_df[found[hit]]
+        user_idf = _bm25_idf(self.user_documents[owner_index], user_df)
+        global_idf = _bm25_idf(self.global_documents, self.global_df[term_index])
+        return TAG_SCORING_USER_WEIGHT * user_idf + (1 - TAG_SCORING_USER_WEIGHT) * global_idf
+
+
+def _bm25_idf(documents, df):
+    return np.log1p((documents - df + 0.5) / (df + 0.5))
+
+
+# --- Ranking ---
+def rank(documents: Sequence[Document], db: Optional[Session] = None, method: Optional[str] = None,
+         limit: int = MAX_TAGS) -> List[List[str]]:
+    """
+    Up to `limit` tags per document, best first. Frequencies are read through `db`; without a
+    session every term counts as unseen, which ranks by (saturated) term frequency alone.
+    """
+    method = method or TAG_SCORING
+    if method not in METHODS:
+        raise ValueError(f"Unknown tag scoring method: {method}")
+    tags: List[List[str]] = [[] for _ in documents]
+    # Token lists alternate prompt, response for every document.
+    lengths = np.fromiter(
+        (len(nouns) for _, prompt, response in documents for nouns in (prompt, response)),
+        dtype=np.int64, count=2 * len(documents),
+    )
+    if not lengths.sum():
+        return tags
+
+    vocab: Dict[str, int] = {}
+    tokens = chain.from_iterable(nouns for _, prompt, response in documents for nouns in (prompt, response))
+    token_terms = np.fromiter((vocab.setdefault(token, len(vocab)) for token in tokens), dtype=np.int64, count=lengths.sum())
+    token_documents = np.repeat(np.repeat(np.arange(len(documents)), 2), lengths)
+    token_weights = np.repeat(np.tile([PROMPT_WEIGHT, 1], len(documents)), lengths)
+
+    # One entry per distinct (document, term); `first` is where the term first appears in the document.
+    keys, first, inverse = np.unique(token_documents * len(vocab) + token_terms, return_index=True, return_inverse=True)
+    tf = np.bincount(inverse, weights=token_weights)
+    entry_documents, entry_terms = np.divmod(keys, len(vocab))
+
+    if method == "frequency":
+        scores = tf
+    else:
+        owners: Dict[int, int] = {}
+        owner_index = np.array([owners.setdefault(owner_id, len(owners)) for owner_id, _, _ in documents])
+        frequencies = Frequencies.load(db, owners, vocab) if db is not None else Frequencies(owners, vocab)
+        idf = frequencies.idf(owner_index[entry_documents], entry_terms)
+        if method == "bm25":
+            scores = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1)
+        else:
+            scores = idf * tf
+
+    # Best first within each document; ties keep the order of first appearance.
+    order = np.lexsort((first, -scores, entry_documents))
+    ranked_documents = entry_documents[order]
+    position = np.arange(len(order)) - np.searchsorted(ranked_documents, ranked_documents)
+    best = order[position < limit]
+    terms = list(vocab)
+    for document, term in zip(entry_documents[best].tolist(), entry_terms[best].tolist()):
+        tags[document].append(terms[term])
+    return tags
@@ -0,0 +1,223 @@
+"""
+Background tagging worker pool.
+
+Conversations are committed by the API first and tagged here afterwards, so the
+KoNLPy tokenization in `crud.extract_and_add_tags` never sits on the request path.
+The pool is bounded: when the queue is full, `submit` gives up quickly and the
+conversation stays 'pending' until `submit_pending` picks it up again.
+
+Every API process runs its own pool and `submit_pending` may queue the same ids in several of
+them, so a worker first claims the row ('pending' -> 'running' in one UPDATE) and skips it when
+another worker got there first. Claims left behind by a crashed process are released by
+`submit_pending` once they are older than TAGGING_CLAIM_TIMEOUT.
+"""
+import datetime
+import logging
+import os
+import queue
+import threading
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import crud
+import database
+import instrumentation
+import models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TAGGING_WORKERS = int(os.getenv("TAGGING_WORKERS", "2"))
+TAGGING_QUEUE_SIZE = int(os.getenv("TAGGING_QUEUE_SIZE", "1000"))
+TAGGING_MAX_RETRIES = int(os.getenv("TAGGING_MAX_RETRIES", "3"))
+TAGGING_RETRY_BACKOFF = float(os.getenv("TAGGING_RETRY_BACKOFF", "1.0"))  # seconds, doubled per attempt
+# How long `submit` may wait for a free slot. 0 keeps async endpoints from ever blocking the event loop.
+TAGGING_SUBMIT_TIMEOUT = float(os.getenv("TAGGING_SUBMIT_TIMEOUT", "0"))  # seconds
+# 'running' rows claimed longer ago than this are assumed abandoned and tagged again.
+TAGGING_CLAIM_TIMEOUT = float(os.getenv("TAGGING_CLAIM_TIMEOUT", "600"))  # seconds
+
+
+class TaggingWorker:
+    """A fixed set of threads draining a bounded queue of conversation ids."""
+
+    def __init__(self, num_workers: int, queue_size: int, max_retries: int, retry_backoff: float):
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "rejected": 0, "skipped": 0, "done": 0, "retried": 0, "failed": 0}
+
+    # --- Lifecycle ---
+    def start(self):
+        """Start the worker threads. Calling it twice is a no-op."""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self._run, name=f"tagging-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %d tagging workers (queue size %d)", self.num_workers, self._queue.maxsize)
+
+    def stop(self, timeout: float = 5.0):
+        """Ask the workers to finish their current job and exit."""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    # --- Submission ---
+    def submit(self, conversation_id: int, attempt: int = 0, timeout: float = TAGGING_SUBMIT_TIMEOUT) -> bool:
+        """
+        Queue a conversation for tagging.
+        Returns False when the queue stays full for `timeout` seconds (back-pressure);
+        the conversation is left 'pending' and will be retried by `submit_pending`.
+        """
+        try:
+            self._queue.put((conversation_id, attempt), timeout=timeout)
+        except queue.Full:
+            self._count("rejected")
+            logger.warning("Tagging queue full, conversation %s left pending", conversation_id)
+            return False
+        self._count("submitted")
+        return True
+
+    def submit_pending(self, owner_id: Optional[int] = None):
+        """
+        Feed every 'pending' conversation into the queue from a helper thread, after releasing
+        stale claims. Blocks on the queue instead of dropping work, so it is safe for large backlogs.
+        """
+        def feed():
+            db: Session = database.SessionLocal()
+            try:
+                released = release_stale_claims(db, owner_id)
+                if released:
+                    logger.warning("Released %d stale tagging claims", released)
+                q = db.query(models.Conversation.id).filter(
+                    models.Conversation.tagging_status == models.TAGGING_PENDING
+                )
+                if owner_id is not None:
+                    q = q.filter(models.Conversation.owner_id == owner_id)
+                pending_ids = [row.id for row in q.order_by(models.Conversation.id)]
+            finally:
+                db.close()
+
+            for conversation_id in pending_ids:
+                while not self._stopping.is_set():
+                    if self.submit(conversation_id, timeout=1.0):
+                        break
+                if self._stopping.is_set():
+                    return
+            if pending_ids:
+                logger.info("Queued %d pending conversations for tagging", len(pending_ids))
+
+        threading.Thread(target=feed, name="tagging-feeder", daemon=True).start()
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and job counters."""
+        with self._lock:
+            counters = dict(self._counters)
+        return {"queue_depth": self._queue.qsize(), "queue_size": self._queue.maxsize, **counters}
+
+    # --- Internals ---
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                conversation_id, attempt = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._process(conversation_id, attempt)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, conversation_id: int, attempt: int):
+        db: Session = database.SessionLocal()
+        try:
+            if not claim(db, conversation_id):
+                self._count("skipped")  # Deleted, already tagged, or claimed by another worker.
+                return
+            conversation = db.get(models.Conversation, conversation_id)
+            if conversation is None:
+                return
+            crud.extract_and_add_tags(db, conversation)
+            conversation.tagging_status = models.TAGGING_DONE
+            # Named apart from crud's "tagging.commit" so each commit is recorded once.
+            with instrumentation.span("tagging_worker.commit"):
+                db.commit()
+            self._count("done")
+        except Exception:
+            db.rollback()
+            if attempt < self.max_retries:
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning("Tagging conversation %s failed, retrying in %.1fs", conversation_id, delay, exc_info=True)
+                self._count("retried")
+                # Hand the row back so the retry (or any other worker) can claim it again.
+                self._set_status(conversation_id, models.TAGGING_PENDING)
+                timer = threading.Timer(delay, self.submit, args=(conversation_id, attempt + 1))
+                timer.daemon = True
+                timer.start()
+            else:
+                logger.exception("Tagging conversation %s failed after %d attempts", conversation_id, attempt + 1)
+                self._count("failed")
+                self._set_status(conversation_id, models.TAGGING_FAILED)
+        finally:
+            db.close()
+
+    def _set_status(self, conversation_id: int, status: str):
+        db: Session = database.SessionLocal()
+        try:
+            db.query(models.Conversation).filter(models.Conversation.id == conversation_id).update(
+                {models.Conversation.tagging_status: status}
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+# --- Claims ---
+def claim(db: Session, conversation_id: int) -> bool:
+    """Atomically move a 'pending' conversation to 'running'. False if it isn't pending (any more)."""
+    result = db.execute(
+        update(models.Conversation)
+        .where(models.Conversation.id == conversation_id,
+               models.Conversation.tagging_status == models.TAGGING_PENDING)
+        .values(tagging_status=models.TAGGING_RUNNING, tagging_claimed_at=datetime.datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def release_stale_claims(db: Session, owner_id: Optional[int] = None,
+                         timeout: float = TAGGING_CLAIM_TIMEOUT) -> int:
+    """Set 'running' conversations claimed more than `timeout` seconds ago back to 'pending'."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=timeout)
+    stmt = (
+        update(models.Conversation)
+        .where(models.Conversation.tagging_status == models.TAGGING_RUNNING,
+               (models.Conversation.tagging_claimed_at < cutoff) | models.Conversation.tagging_claimed_at.is_(None))
+        .values(tagging_status=models.TAGGING_PENDING)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(models.Conversation.owner_id == owner_id)
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+
+# One pool per process; started and stopped by the FastAPI app.
+worker = TaggingWorker(
+    num_workers=TAGGING_WORKERS,
+    queue_size=TAGGING_QUEUE_SIZE,
+    max_retries=TAGGING_MAX_RETRIES,
+    retry_backoff=TAGGING_RETRY_BACKOFF,
+)
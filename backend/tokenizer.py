@@ -0,0 +1,132 @@
+"""
+Shared Korean tokenizer with pluggable engines.
+
+`crud.get_nouns` only needs Okt-style (word, tag) pairs, where Korean nouns are tagged 'Noun'
+and Latin words 'Alpha'. The engine is chosen per deployment with TOKENIZER_ENGINE:
+- okt:   KoNLPy Okt (default). Best accuracy, but needs JPype and a JVM in every process.
+- kiwi:  kiwipiepy morphological analyser, if installed. Native code, no JVM.
+- regex: Hangul runs with particles and light-verb endings stripped. No dependencies,
+         lowest memory and fastest start, at some cost in accuracy.
+
+Constructing an engine is far more expensive than tagging a sentence (for Okt it starts the
+JVM), so each process keeps one instance per engine. Okt calls are serialised so request
+threads and tagging workers can share it safely.
+"""
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENGINE = os.getenv("TOKENIZER_ENGINE", "okt").lower()
+# Run one tagging pass at startup so the JIT and dictionaries are loaded before the first save.
+TOKENIZER_PREWARM = os.getenv("TOKENIZER_PREWARM", "true").lower() in ("1", "true", "yes")
+
+# Identifies the tokenizer in tag cache keys, so switching tokenizers invalidates cached nouns.
+ENGINE_NAME = TOKENIZER_ENGINE
+
+WARM_UP_TEXT = "프롬프토리는 ChatGPT와 Gemini 대화를 자동으로 백업합니다."
+
+
+class OktEngine:
+    name = "okt"
+
+    def __init__(self):
+        from konlpy.tag import Okt
+        self._okt = Okt()
+        self._lock = threading.Lock()
+
+    def pos(self, text: str, norm: bool = True, stem: bool = True) -> List[Tuple[str, str]]:
+        with self._lock:
+            return self._okt.pos(text, norm=norm, stem=stem)
+
+
+class KiwiEngine:
+    name = "kiwi"
+
+    # Kiwi (Sejong) tags mapped onto the Okt tags `get_nouns` looks for
+    _TAGS = {"NNG": "Noun", "NNP": "Noun", "SL": "Alpha", "SN": "Number"}
+
+    def __init__(self):
+        from kiwipiepy import Kiwi
+        self._kiwi = Kiwi()
+
+    def pos(self, text: str, norm: bool = True, stem: bool = True) -> List[Tuple[str, str]]:
+        return [(token.form, self._TAGS.get(token.tag, token.tag)) for token in self._kiwi.tokenize(text)]
+
+
+class RegexEngine:
+    name = "regex"
+
+    _TOKEN = re.compile(r"[가-힣]+|[A-Za-z]+|[0-9]+")
+    # "정렬해줘" -> "정렬", "사용하세요" -> "사용": a noun followed by 하다/되다 and an ending.
+    _LIGHT_VERB = re.compile(r"^([가-힣]{2,}?)(?:하|해|했|합|되|돼|됐|됩)[가-힣]*$")
+    # Other predicates carry no keyword.
+    _PREDICATE_ENDINGS = ("습니다", "니다", "세요", "어요", "아요", "이다", "는다", "었다", "았다", "줘", "까요", "나요")
+    # Longest first, so "에서" is stripped before "서".
+    _PARTICLES = tuple(sorted((
+        "은", "는", "이", "가", "을", "를", "에", "의", "도", "만", "로", "와", "과", "랑", "나",
+        "에서", "으로", "에게", "한테", "까지", "부터", "처럼", "보다", "이나", "이랑", "하고", "이라", "라는",
+        "이라는", "에서는", "으로는", "에서도", "에는", "에도", "와는", "과는", "들이", "들을", "들은", "들의",
+    ), key=len, reverse=True))
+
+    def pos(self, text: str, norm: bool = True, stem: bool = True) -> List[Tuple[str, str]]:
+        tagged = []
+        for word in self._TOKEN.findall(text):
+            if word[0].isdigit():
+                tagged.append((word, "Number"))
+            elif word[0].isascii():
+                tagged.append((word, "Alpha"))
+            else:
+                noun = self._noun(word)
+                tagged.append((noun, "Noun") if noun else (word, "Verb"))
+        return tagged
+
+    def _noun(self, word: str) -> Optional[str]:
+        match = self._LIGHT_VERB.match(word)
+        if match:
+            return match.group(1)
+        if word in self._PARTICLES or word.endswith(self._PREDICATE_ENDINGS):
+            return None  # "useCallback으로" leaves a bare particle behind
+        for particle in self._PARTICLES:
+            if word.endswith(particle) and len(word) - len(particle) >= 2:
+                return word[:-len(particle)]
+        return word
+
+
+ENGINES = {engine.name: engine for engine in (OktEngine, KiwiEngine, RegexEngine)}
+
+_engines: Dict[str, object] = {}
+_init_lock = threading.Lock()
+
+
+def get_engine(name: Optional[str] = None):
+    """Return the process-wide instance of an engine (TOKENIZER_ENGINE by default), creating it on first use."""
+    name = name or TOKENIZER_ENGINE
+    engine = _engines.get(name)
+    if engine is None:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown tokenizer engine {name!r}; expected one of {', '.join(ENGINES)}")
+        with _init_lock:
+            engine = _engines.get(name)
+            if engine is None:
+                engine = _engines[name] = ENGINES[name]()
+    return engine
+
+
+def pos(text: str, norm: bool = True, stem: bool = True, engine: Optional[str] = None) -> List[Tuple[str, str]]:
+    """Thread-safe Okt-style `pos` on the shared engine instance."""
+    return get_engine(engine).pos(text, norm=norm, stem=stem)
+
+
+def init(prewarm: bool = TOKENIZER_PREWARM):
+    """Create the shared engine at startup, optionally running a warm-up pass."""
+    try:
+        get_engine()
+        if prewarm:
+            pos(WARM_UP_TEXT)
+    except Exception:
+        # Tagging retries on its own; a missing JVM must not keep the API from starting.
+        logger.exception("Failed to initialise the %s tokenizer", TOKENIZER_ENGINE)
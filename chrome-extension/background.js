@@ -6,6 +6,8 @@ chrome.runtime.onMessageExternal.addListener(
         chrome.storage.local.set({ 'access_token': request.token }, () => {
           console.log('Promptory BG: Access token stored successfully.');
           sendResponse({ status: 'success' });
+          // Send what was kept queued while there was no valid token.
+          flushQueue();
         });
       } else {
         sendResponse({ status: 'failure', message: 'No token provided' });
@@ -15,43 +17,154 @@ chrome.runtime.onMessageExternal.addListener(
   }
 );
 
-// Listens for a message from the content script to save a conversation.
-chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
-  if (request.type === 'SAVE_CONVERSATION') {
-    console.log('[Promptory BG] Received conversation from content script:', request.payload);
-    
-    chrome.storage.local.get('access_token', (result) => {
-      const token = result.access_token;
-      if (!token) {
-        console.error('[Promptory BG] No access token found.');
-        sendResponse({ status: 'error', message: 'No token found' });
-        return;
-      }
+// --- Upload queue ---
+// Conversations are buffered in chrome.storage.local and sent in batches, so history
+// backfills and busy sessions don't turn into hundreds of single-row requests.
+// The queue lives in storage because the service worker can be stopped at any time.
+const API_BASE_URL = 'https://promptory-backend-w2ya.onrender.com';
+const QUEUE_KEY = 'pending_conversations';
+const FAILED_KEY = 'failed_conversations'; // Conversations the server refused outright
+const BATCH_MAX_SIZE = 20;         // Flush as soon as this many conversations are queued
+const BATCH_FLUSH_DELAY_MS = 3000; // ...or this long after the first one was queued
+
+let flushTimer = null;
+let queueLock = Promise.resolve();
+
+// Serializes read-modify-write access to the stored queue.
+function withQueue(fn) {
+  const run = queueLock.then(() => new Promise((resolve) => {
+    chrome.storage.local.get(QUEUE_KEY, (result) => resolve(result[QUEUE_KEY] || []));
+  })).then(fn);
+  queueLock = run.catch(() => {});
+  return run;
+}
+
+function saveQueue(queue) {
+  return new Promise((resolve) => chrome.storage.local.set({ [QUEUE_KEY]: queue }, resolve));
+}
+
+function enqueueConversation(payload) {
+  return withQueue(async (queue) => {
+    queue.push(payload);
+    await saveQueue(queue);
+    if (queue.length >= BATCH_MAX_SIZE) {
+      flushQueue();
+    } else {
+      scheduleFlush();
+    }
+    return queue.length;
+  });
+}
+
+function scheduleFlush() {
+  if (flushTimer) return;
+  flushTimer = setTimeout(() => {
+    flushTimer = null;
+    flushQueue();
+  }, BATCH_FLUSH_DELAY_MS);
+}
+
+// Network errors, rate limiting and server errors may pass on a later attempt.
+function isRetryable(status) {
+  return status === 429 || status >= 500;
+}
+
+// Keeps conversations the server refused, so they don't block the queue but aren't silently lost,
+// and shows their number on the extension icon.
+function deadLetter(items, reason) {
+  console.error(`[Promptory BG] Server rejected ${items.length} conversation(s) (${reason}); moved to ${FAILED_KEY}.`, items);
+  return new Promise((resolve) => {
+    chrome.storage.local.get(FAILED_KEY, (result) => {
+      const failed = (result[FAILED_KEY] || []).concat(items.map((payload) => ({ payload, reason })));
+      chrome.storage.local.set({ [FAILED_KEY]: failed }, () => {
+        chrome.action.setBadgeBackgroundColor({ color: '#d93025' });
+        chrome.action.setBadgeText({ text: String(failed.length) });
+        resolve();
+      });
+    });
+  });
+}
+
+// `batchSize` drops to 1 after a rejected batch, so that only the conversations the server
+// refuses on their own end up in the dead-letter list.
+function flushQueue(batchSize = BATCH_MAX_SIZE) {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+
+  return withQueue(async (queue) => {
+    if (queue.length === 0) return;
 
-      const apiUrl = 'https://promptory-backend-w2ya.onrender.com/api/v1/conversations';
-      fetch(apiUrl, {
+    const { access_token: token } = await chrome.storage.local.get('access_token');
+    if (!token) {
+      console.error('[Promptory BG] No access token found, keeping queued conversations.');
+      return;
+    }
+
+    const batch = queue.slice(0, batchSize);
+    try {
+      const res = await fetch(`${API_BASE_URL}/api/v1/conversations:batch`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
           'Authorization': `Bearer ${token}`,
         },
-        body: JSON.stringify(request.payload),
-      })
-      .then(res => {
-        if (!res.ok) {
-          throw new Error(`Server responded with: ${res.status}`);
+        body: JSON.stringify(batch),
+      });
+      if (res.status === 401) {
+        // The token expired; keep everything until the web app hands over a new one.
+        console.error('[Promptory BG] Access token was rejected, keeping queued conversations.');
+        return;
+      }
+      if (!res.ok && isRetryable(res.status)) {
+        throw new Error(`Server responded with: ${res.status}`);
+      }
+      if (!res.ok) {
+        // The request itself was refused (e.g. 413, 422); sending it again would fail the same way.
+        if (batch.length > 1) {
+          console.error(`[Promptory BG] Batch rejected with ${res.status}, retrying one conversation at a time.`);
+          setTimeout(() => flushQueue(1), 0);
+          return;
         }
-        return res.json();
-      })
-      .then(data => {
-        console.log('[Promptory BG] Conversation saved successfully:', data);
-        sendResponse({ status: 'success', data });
-      })
-      .catch(error => {
-        console.error('[Promptory BG] Error sending conversation to backend:', error.message);
+        await deadLetter(batch, `HTTP ${res.status}`);
+      } else {
+        const data = await res.json();
+        // Per-item errors are validation failures; retrying them would never succeed.
+        data.results
+          .filter((item) => item.error)
+          .forEach((item) => console.error('[Promptory BG] Conversation rejected:', item.error, batch[item.index]));
+        console.log(`[Promptory BG] Uploaded ${batch.length} conversation(s).`);
+      }
+    } catch (error) {
+      // Network or server error: keep everything queued and try again later.
+      console.error('[Promptory BG] Error sending conversations to backend:', error.message);
+      scheduleFlush();
+      return;
+    }
+
+    const remaining = queue.slice(batch.length);
+    await saveQueue(remaining);
+    if (remaining.length > 0) {
+      setTimeout(() => flushQueue(batchSize), 0);
+    }
+  });
+}
+
+// Send anything left over from before the service worker was stopped.
+flushQueue();
+
+// Listens for a message from the content script to save a conversation.
+chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
+  if (request.type === 'SAVE_CONVERSATION') {
+    console.log('[Promptory BG] Received conversation from content script:', request.payload);
+
+    enqueueConversation(request.payload)
+      .then((queued) => sendResponse({ status: 'success', queued }))
+      .catch((error) => {
+        console.error('[Promptory BG] Error queueing conversation:', error.message);
         sendResponse({ status: 'error', message: error.message });
       });
-    });
 
     // Return true to indicate that the response is sent asynchronously.
     return true;
@@ -22,7 +22,7 @@
                 if (chrome.runtime.lastError) {
                     console.error('[Promptory] Error sending message to background:', chrome.runtime.lastError.message);
                 } else if (response && response.status === 'success') {
-                    console.log('[Promptory] Background script confirmed conversation was saved.');
+                    console.log('[Promptory] Background script queued the conversation for upload.');
                 } else {
                     console.error('[Promptory] Background script reported an error.', response);
                 }
@@ -2,6 +2,7 @@
 
 import { useEffect, useState, useCallback } from 'react';
 import { useParams, useRouter } from 'next/navigation';
+import Link from 'next/link';
 import { useAuth } from '@/app/context/AuthContext';
 import { fetchJson, apiUrl } from '@/app/lib/api';
 
@@ -15,6 +16,16 @@ interface Conversation {
   tags: { name: string }[];
 }
 
+interface RelatedConversation {
+  conversation: {
+    id: number;
+    source: string;
+    snippet: string;
+    conversation_timestamp: string;
+  };
+  similarity: number;
+}
+
 export default function ConversationPage() {
   const { token } = useAuth();
   const params = useParams();
@@ -27,6 +38,7 @@ export default function ConversationPage() {
   const [conversation, setConversation] = useState<Conversation | null>(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [related, setRelated] = useState<RelatedConversation[]>([]);
 
   const fetchConversation = useCallback(async () => {
     if (!token || !id) {
@@ -50,6 +62,16 @@ export default function ConversationPage() {
     fetchConversation();
   }, [fetchConversation]);
 
+  // 비슷한 대화는 부가 정보라 실패해도 페이지는 그대로 보여준다.
+  useEffect(() => {
+    if (!token || !id) return;
+    fetchJson<{ items: RelatedConversation[] }>(`/api/v1/conversations/${id}/related?k=5`, {
+      headers: { Authorization: `Bearer ${token}` },
+    })
+      .then((data) => setRelated(data.items))
+      .catch(() => setRelated([]));
+  }, [id, token]);
+
   const handleDelete = async () => {
     if (!token || !id) return;
     if (!window.confirm('Are you sure you want to delete this conversation?')) return;
@@ -131,6 +153,28 @@ export default function ConversationPage() {
               )}
             </div>
           </div>
+
+          {related.length > 0 && (
+            <div className="mt-8 pt-6 border-t border-border">
+              <h3 className="text-2xl font-semibold text-text-primary mb-4">Related Conversations</h3>
+              <ul className="space-y-3">
+                {related.map(({ conversation: item, similarity }) => (
+                  <li key={item.id}>
+                    <Link
+                      href={`/conversations/${item.id}`}
+                      className="block p-4 rounded-lg bg-background border border-border hover:shadow-sm transition-shadow duration-200"
+                    >
+                      <p className="text-text-primary truncate">{item.snippet}</p>
+                      <p className="text-xs text-text-secondary mt-1">
+                        {item.source} | {new Date(item.conversation_timestamp + 'Z').toLocaleDateString()} |{' '}
+                        {Math.round(similarity * 100)}% similar
+                      </p>
+                    </Link>
+                  </li>
+                ))}
+              </ul>
+            </div>
+          )}
         </div>
       </div>
     </div>
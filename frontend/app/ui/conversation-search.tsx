@@ -5,18 +5,30 @@ import { useState, useEffect } from 'react';
 import ConversationItem from '@/app/ui/conversation-item';
 import { useAuth } from '@/app/context/AuthContext';
 import { Input } from '@/components/ui/input';
+import { Button } from '@/components/ui/button';
 import { DatePicker } from '@/app/ui/date-picker';
 import { format } from 'date-fns';
 import { fetchJson, apiUrl } from '@/app/lib/api';
 
 interface Conversation {
   id: string;
-  prompt: string;
-  summary: string | null;
+  snippet: string;
   tags: { name: string }[];
   created_at: string;
 }
 
+interface ConversationPage {
+  items: Conversation[];
+  next_cursor: string | null;
+}
+
+interface CalendarMonth {
+  month: string;
+  days: { date: string; count: number }[];
+}
+
+const PAGE_SIZE = 20;
+
 export default function ConversationSearch() {
   const { token, isLoading: isAuthLoading } = useAuth();
   const searchParams = useSearchParams();
@@ -25,7 +37,10 @@ export default function ConversationSearch() {
   const [debouncedSearchTerm, setDebouncedSearchTerm] = useState(initialSearch);
   const [date, setDate] = useState<Date | undefined>();
   const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [activeDates, setActiveDates] = useState<Date[]>([]);
+  const [month, setMonth] = useState<Date>(new Date());
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
@@ -35,23 +50,34 @@ export default function ConversationSearch() {
     return () => clearTimeout(handler);
   }, [searchTerm]);
 
-  // fetch all conversation dates (for DatePicker highlights)
+  // fetch the days with conversations in the displayed month (for DatePicker highlights)
   useEffect(() => {
     if (isAuthLoading || !token) return;
 
-    async function fetchAllConversationDates() {
+    async function fetchActiveDates() {
       try {
         const headers = { Authorization: `Bearer ${token}` };
-        const data = await fetchJson<Conversation[]>('/api/v1/conversations', { headers });
-        const dates = data.map((c) => new Date(c.created_at));
-        setActiveDates(dates);
+        const calendar = await fetchJson<CalendarMonth>(
+          `/api/v1/statistics/calendar?month=${format(month, 'yyyy-MM')}`,
+          { headers },
+        );
+        // Parse as local dates; new Date('yyyy-MM-dd') would be UTC midnight.
+        setActiveDates(calendar.days.map((d) => new Date(`${d.date}T00:00:00`)));
       } catch (err) {
         console.error(err);
       }
     }
 
-    fetchAllConversationDates();
-  }, [token, isAuthLoading]);
+    fetchActiveDates();
+  }, [token, isAuthLoading, month]);
+
+  const buildPath = (cursor?: string | null) => {
+    const params = new URLSearchParams({ limit: String(PAGE_SIZE) });
+    if (debouncedSearchTerm) params.append('q', debouncedSearchTerm);
+    if (date) params.append('date', format(date, 'yyyy-MM-dd'));
+    if (cursor) params.append('cursor', cursor);
+    return `/api/v1/conversations?${params}`;
+  };
 
   // fetch conversations with filters
   useEffect(() => {
@@ -66,16 +92,9 @@ export default function ConversationSearch() {
       setError(null);
       try {
         const headers = { Authorization: `Bearer ${token}` };
-
-        const params = new URLSearchParams();
-        if (debouncedSearchTerm) params.append('q', debouncedSearchTerm);
-        if (date) params.append('date', format(date, 'yyyy-MM-dd'));
-
-        const qs = params.toString();
-        const path = qs ? `/api/v1/conversations?${qs}` : '/api/v1/conversations';
-
-        const data = await fetchJson<Conversation[]>(path, { headers });
-        setConversations(data);
+        const page = await fetchJson<ConversationPage>(buildPath(), { headers });
+        setConversations(page.items);
+        setNextCursor(page.next_cursor);
       } catch (err) {
         setError(err instanceof Error ? err.message : 'An unknown error occurred');
       } finally {
@@ -86,6 +105,21 @@ export default function ConversationSearch() {
     fetchConversations();
   }, [token, debouncedSearchTerm, date, isAuthLoading]);
 
+  const handleLoadMore = async () => {
+    if (!token || !nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const headers = { Authorization: `Bearer ${token}` };
+      const page = await fetchJson<ConversationPage>(buildPath(nextCursor), { headers });
+      setConversations((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : 'An unknown error occurred');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDelete = async (id: string) => {
     if (!token) return;
 
@@ -118,7 +152,13 @@ export default function ConversationSearch() {
           onChange={(e) => setSearchTerm(e.target.value)}
           className="flex-grow"
         />
-        <DatePicker date={date} setDate={setDate} activeDates={activeDates} />
+        <DatePicker
+          date={date}
+          setDate={setDate}
+          activeDates={activeDates}
+          month={month}
+          onMonthChange={setMonth}
+        />
       </div>
 
       <h2 className="text-2xl font-bold mb-4">Conversation List</h2>
@@ -128,7 +168,7 @@ export default function ConversationSearch() {
             <ConversationItem
               key={convo.id}
               id={convo.id}
-              title={convo.prompt}
+              title={convo.snippet}
               tags={convo.tags.map((t) => t.name)}
               created_at={convo.created_at}
               onDelete={handleDelete}
@@ -138,6 +178,13 @@ export default function ConversationSearch() {
           <p>No conversations found.</p>
         )}
       </div>
+      {nextCursor && (
+        <div className="flex justify-center mt-4">
+          <Button variant="outline" onClick={handleLoadMore} disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more'}
+          </Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -17,9 +17,11 @@ interface DatePickerProps {
   date: Date | undefined;
   setDate: (date: Date | undefined) => void;
   activeDates?: Date[];
+  month?: Date;
+  onMonthChange?: (month: Date) => void;
 }
 
-export function DatePicker({ date, setDate, activeDates }: DatePickerProps) {
+export function DatePicker({ date, setDate, activeDates, month, onMonthChange }: DatePickerProps) {
   return (
     <Popover>
       <PopoverTrigger asChild>
@@ -39,6 +41,8 @@ export function DatePicker({ date, setDate, activeDates }: DatePickerProps) {
           mode="single"
           selected={date}
           onSelect={setDate}
+          month={month}
+          onMonthChange={onMonthChange}
           disabled={(day) => {
             if (!activeDates) return false;
             return !activeDates.some(activeDate => 